@@ -15,7 +15,6 @@ from qutip import *
 from collections import OrderedDict
 import qutip as qt
 import numpy as np
-import statistics as st
 import matplotlib.pyplot as plt
 import pandas as pd
 import multiprocessing
@@ -23,6 +22,14 @@ import pickle
 import os
 import datetime
 
+from qkd_trace import Trace
+from qkd_batch import StreamCycle, RawStreams, NO_OF_BASES
+from qkd_sketch import QBERSketch
+from qkd_checkpoint import Checkpoint
+from qkd_rawlog import RawLog
+from qkd_entropy import OpenEntropySource
+from qkd_auth import Authenticator
+
 """
 Standard Basis |0> 	   	 & |1>       for the rectilinear basis.
 Hadamard Basis |0> + |1> & |0> - |1> for the diagonal basis.
@@ -51,10 +58,9 @@ class Qubit():
 	def StandardMeasurement(self):
 		if self.__isMeasured:
 			raise Exception("Qubit already measured!")
-		M = 1000000
-		m = np.random.randint(0,M)
 		self.__isMeasured = True
-		if m < round(pow(np.dot(self.__standard,self.__state).norm(),2),2)*M:
+		#outcome 0 with probability |<0|psi>|^2, sampled exactly
+		if np.random.random_sample() < pow(np.dot(self.__standard,self.__state).norm(),2):
 			return 0
 		else:
 			return 1
@@ -68,13 +74,13 @@ class Qubit():
 	#representation of qubit
 	def Show(self):
 		var = ""
-		
-		if round(np.dot(basis(2,0).dag(),self.__state).norm(),2):
-			var += "{0}|0>".format(str(round(np.dot(basis(2,0).dag(),self.__state).norm(),2)) if round(np.dot(basis(2,0).dag(),self.__state).norm(),2) != 1.0 else '')
-		if round(np.dot(basis(2,1).dag(),self.__state).norm(),2):
-			if var:
-				var += " + "
-			var += "{0}|1>".format(str(round(np.dot(basis(2,1).dag(),self.__state).norm(),2)) if round(np.dot(basis(2,1).dag(),self.__state).norm(),2) != 1.0 else '')
+		amplitudes = [round(np.dot(basis(2,k).dag(),self.__state).norm(),2) for k in range(2)]
+
+		for k in range(2):
+			if amplitudes[k]:
+				if var:
+					var += " + "
+				var += "{0}|{1}>".format(str(amplitudes[k]) if amplitudes[k] != 1.0 else '', k)
 
 		return var.ljust(17)[:17]
 #class end "Qubit"
@@ -165,41 +171,28 @@ class User():
 #class end "User"
 
 #static method for the generation of array of random bits i.e. 0 & 1
+#drawn from the entropy source in one block, numpy's global generator without ENTROPY
 def GenerateRandomBits(no_of_qubits):
-	var = list()
-	for i in range(no_of_qubits):
-		rnd = np.random.randint(0,2)
-		var.append(rnd)
-	return var	
-
-#static method for converting bits and basis into classical symbols
-def ConvertToSymbols(listOfBits, listOfBasis, isBasis):
-	var = list()
-	if isBasis:
-		for i in range(NO_OF_QUBITS):
-			if not listOfBits[i]:
-				var.append("+")
-			else:
-				var.append("X")
-	else:
-		for i in range(NO_OF_QUBITS):
+	if entropy is not None:
+		return entropy.Bits(no_of_qubits).tolist()
+	return np.random.randint(0,2,no_of_qubits).tolist()
+
+#static method for the authentication of the classical messages of a cycle & its net key
+def AuthenticateCycle(siftedBits, errorBits):
+	if authenticator is None:
+		return
+	#Bob announces his basis, with B92 only the conclusive results are announced (the sifting message)
+	announcedBits = 0 if PROTOCOL == 'b92' else int(NO_OF_BASES[PROTOCOL] - 1).bit_length()
+	netKey, consumed, elapsed = authenticator.Cycle(NO_OF_QUBITS, announcedBits, siftedBits, errorBits / siftedBits if siftedBits else 0)
 
-			#for basis = 1, lets consider its standard basis
-			if not listOfBasis[i]:
-				#Standard Basis
-				if not listOfBits[i]:
-					var.append("|")
-				else:
-					var.append("━")
+	if not SILENT:
+		print("Net Key 	:", netKey, "(authentication used", consumed, "bit(s) of key &", np.round(elapsed * 1000, 3), "ms)")
 
-			#for basis = 0, lets consider its hadamard basis
-			else:
-				#Hadamard Basis
-				if not listOfBits[i]:
-					var.append("╱")
-				else:
-					var.append("╲")
-	return var	
+#static method for recording the QBER of a cycle into the sketch (and the list of QBERs)
+def RecordQBER(qber):
+	sketch.Add(qber)
+	if KEEP_QBERS:
+		QBERs.append(qber)
 
 def ClearScreen():
 	os.system('cls' if os.name == 'nt' else 'clear')
@@ -217,52 +210,41 @@ class QKDProtocol(multiprocessing.Process):
 		with open(fileName+'.txt','ab') as textFile:
 			np.savetxt(textFile, ["%s\n" % data], fmt='%s')
 
-	def Execute(self):
+	def Execute(self,cycle):
 		alice = User("Alice")
 		aliceBasis = GenerateRandomBits(NO_OF_QUBITS)
 		aliceBits = GenerateRandomBits(NO_OF_QUBITS)
-		aliceSymBasis = ConvertToSymbols(aliceBasis, aliceBasis, True)
-		aliceSymBits = ConvertToSymbols(aliceBits, aliceBasis, False)
 		qubits = alice.SendQubits(aliceBits, aliceBasis)
-		aliceQubits = qubits
 
 		if EVE_EXIST:
 			eve = User("Eve")
 			eveBasis = GenerateRandomBits(NO_OF_QUBITS)
 			eveBits = eve.ReceiveQubits(qubits, eveBasis)
-			eveSymBasis = ConvertToSymbols(eveBasis, eveBasis, True)
-			eveSymBits = ConvertToSymbols(eveBits, eveBasis, False)
 			qubits = eve.SendQubits(eveBits, eveBasis)
-			eveQubits = qubits
 
 		bob = User("Bob")
 		bobBasis = GenerateRandomBits(NO_OF_QUBITS)
 		bobBits = bob.ReceiveQubits(qubits, bobBasis)
-		bobSymBasis = ConvertToSymbols(bobBasis, bobBasis, True)
-		bobSymBits = ConvertToSymbols(bobBits, bobBasis, False)
 		
 		aliceKey = list()
 		bobKey = list()
-		correctBasis = list()
-		correctSymBasis = list()
-		correctQubits = list()
 
 		for i in range(NO_OF_QUBITS):
 			if aliceBasis[i] == bobBasis[i]:
 				aliceKey.append(aliceBits[i])
 				bobKey.append(bobBits[i])
-				correctBasis.append(1)
-				correctSymBasis.append("1")
-				
-				if aliceBits[i] == bobBits[i]:
-					correctQubits.append(1)
-				else:
-					correctQubits.append(0)
+
+		if trace is not None:
+			if EVE_EXIST:
+				trace.Record(cycle, EVE_EXIST, aliceBasis=aliceBasis, aliceBits=aliceBits, eveBasis=eveBasis, eveBits=eveBits, bobBasis=bobBasis, bobBits=bobBits)
 			else:
-				correctBasis.append(0)
-				correctQubits.append(0)
-				correctSymBasis.append("0")
+				trace.Record(cycle, EVE_EXIST, aliceBasis=aliceBasis, aliceBits=aliceBits, bobBasis=bobBasis, bobBits=bobBits)
 
+		if rawLog is not None:
+			if EVE_EXIST:
+				rawLog.Record(cycle, aliceBasis=aliceBasis, aliceBits=aliceBits, eveBasis=eveBasis, eveBits=eveBits, bobBasis=bobBasis, bobBits=bobBits)
+			else:
+				rawLog.Record(cycle, aliceBasis=aliceBasis, aliceBits=aliceBits, bobBasis=bobBasis, bobBits=bobBits)
 
 		if aliceKey != bobKey:
 			key = False
@@ -280,7 +262,7 @@ class QKDProtocol(multiprocessing.Process):
 					errorQubit += 1
 			
 			qber = np.round((errorQubit / len(aliceKey)),5)*100
-			QBERs.append(qber)
+			RecordQBER(qber)
 	
 			if not SILENT:
 				print("QBER		:", qber, "%")
@@ -295,7 +277,7 @@ class QKDProtocol(multiprocessing.Process):
 			else:
 				key = True
 				length = len(bobKey)
-				QBERs.append(0)
+				RecordQBER(0)
 
 				if not SILENT:
 					print("QBER		: 0 %")
@@ -305,69 +287,28 @@ class QKDProtocol(multiprocessing.Process):
 					print("Key Length 	: " + str(length))
 					print("Key 		:", aliceKey)
 			
+		AuthenticateCycle(len(aliceKey), sum(a != b for a, b in zip(aliceKey, bobKey)))
+
 		if LOG and not SILENT:
-			print(" ")
-			print(" ")
-			print("--------BIT REPRESENTATION--------")
-			print("Alice Basis        :", aliceBasis)
-			print("Qubits |ei>        :", aliceBits)
-			if EVE_EXIST:
-				print("Eve Basis |gk>     :", eveBasis)
-				print("Qubits |<gk|ei>|^2 :", eveBits)
-				print("Bob Basis |ej>     :", bobBasis)
-				print("Qubits |<ej|gk>|^2 :", bobBits)
-			else:
-				print("Bob Basis |ej>     :", bobBasis)
-				print("Qubits |<ej|ei>|^2 :", bobBits)
-			print(" ")
-			print("Correct Basis      :", correctBasis)
-			print(" ")
-			print(" ")
-
-			print("--------SYMBOL REPRESENTATION--------")
-			print("Alice Basis        :", aliceSymBasis)
-			print("Qubits |ei>        :", aliceSymBits)
-			if EVE_EXIST:
-				print("Eve Basis |gk>     :", eveSymBasis)
-				print("Qubits |<gk|ei>|^2 :", eveSymBits)
-				print("Bob Basis |ej>     :", bobSymBasis)
-				print("Qubits |<ej|gk>|^2 :", bobSymBits)
-			else:
-				print("Bob Basis |ej>     :", bobSymBasis)
-				print("Qubits |<ej|ei>|^2 :", bobSymBits)
-			print(" ")
-			print("Correct Basis      :", correctSymBasis)
-			print(" ")
-			print(" ")
-			
-			print("-------QUBIT REPRESENTATION-------")
-			var = "Alice Qubits |ei>      : "
-			for qubit in aliceQubits:
-				var += qubit.Show() + "   "
-			print(var)
+			print(trace.Render(cycle))
 
-			if EVE_EXIST:
-				var = "Bob Qubits |<ej|ei>|^2 : "
-				for qubit in eveQubits:
-					var += qubit.Show() + "   "
-				print(var)
+	#executing one cycle of NO_OF_QUBITS on the batch engine in blocks of BLOCK_SIZE qubits
+	def ExecuteBlocks(self,cycle):
+		result = StreamCycle(PROTOCOL, NO_OF_QUBITS, BLOCK_SIZE, EVE_EXIST, rng, rawLog=rawLog, cycle=cycle, entropy=entropy)
+		qber = result.QBER()
 
-			print(" ")
-			print(" ")
-			
-			print("Alice generates", format(str(NO_OF_QUBITS)), "random Basis")
-			print("Alice sends to Bob", format(str(NO_OF_QUBITS)), "encoded Qubits")
-			
-			if EVE_EXIST:
-				print("Eve generates", format(str(NO_OF_QUBITS)), "random Basis")
-				print("Eve intercepts and decode Alice's", format(str(NO_OF_QUBITS)), "encoded Qubits")
-				print("Eve sends to Bob as Alice's", format(str(NO_OF_QUBITS)), "encoded Qubits")
-			
-			print("Bob generates", format(str(NO_OF_QUBITS)), "random Basis")
-			print("Bob receives and decode Alice's", format(str(NO_OF_QUBITS)), "encoded Qubits")
+		if qber is None:
+			if not SILENT:
+				print("No qubit is successfully transffered.")
+		else:
+			RecordQBER(qber)
 
-			print(" ")
-			print(" ")
+			if not SILENT:
+				print("Key Length 	: " + str(result.siftedBits))
+				print("Errors		: " + str(result.errorBits))
+				print("QBER		:", qber, "%")
+
+		AuthenticateCycle(result.siftedBits, result.errorBits)
 
 
 #===================================================================
@@ -389,15 +330,101 @@ LOG = False
 #graph only
 SILENT = True
 
+#binary trace of every cycle (file name), None keeps the current cycle in memory while LOG is on
+TRACE_FILE = None
+
+#block size of the batch engine, None executes the qubits one by one
+BLOCK_SIZE = None
+
+#protocol of the batch engine: 'bb84', 'b92' or 'sixstate', the qubit by qubit execution is BB84 only
+PROTOCOL = 'bb84'
+
+#raw log of the bases & bits of every qubit (directory) for post-hoc analysis, None disables it
+RAW_LOG = None
+
+#keep every QBER for the scatter plot, False keeps only the streaming sketch of the QBERs
+KEEP_QBERS = True
+
+#checkpoint file of the run progress, None disables checkpointing
+CHECKPOINT_FILE = None
+
+#no. of cycles between two checkpoints
+CHECKPOINT_EVERY = 100
+
+#entropy source of the basis & bits: 'pcg64', 'philox', 'urandom' or the file name of a QRNG dump, None uses numpy's generators
+ENTROPY = None
+
+#Wegman-Carter MAC of the classical messages: 'polynomial' or 'toeplitz', None leaves the channel authenticated at no cost
+AUTH_MAC = None
+
+#no. of classical messages per authentication tag
+AUTH_BATCH = 16
+
+rng = np.random.default_rng()
+
+entropy = OpenEntropySource(ENTROPY) if ENTROPY else None
+
+#the authenticator draws from its own generator, so it does not change the qubits of the simulation
+authenticator = Authenticator(AUTH_MAC, 62, AUTH_BATCH, rng.spawn(1)[0]) if AUTH_MAC else None
+
+sketch = QBERSketch()
+
+#names of the protocols in the plots
+PROTOCOL_NAMES = {'bb84': 'BB84', 'b92': 'B92', 'sixstate': 'Six-State'}
+
+if PROTOCOL not in PROTOCOL_NAMES:
+	raise Exception("Unknown protocol " + str(PROTOCOL) + ", use 'bb84', 'b92' or 'sixstate'!")
+
+#the Qubit & User model prepares & measures the standard & hadamard basis of BB84 only
+if PROTOCOL != 'bb84' and not BLOCK_SIZE:
+	raise Exception("B92 & six-state run on the batch engine only, set BLOCK_SIZE!")
+
+#the trace holds the qubit by qubit cycles, the batch engine keeps no per-qubit tables to log
+if BLOCK_SIZE and (LOG or TRACE_FILE):
+	raise Exception("LOG & TRACE_FILE trace the qubit by qubit execution, unset BLOCK_SIZE or LOG & TRACE_FILE!")
+
+trace = Trace(TRACE_FILE, 'bb84') if LOG or TRACE_FILE else None
+
+rawLog = RawLog(RAW_LOG, RawStreams(PROTOCOL)) if RAW_LOG else None
+
 ClearScreen()
 
 #execution of protocol
 qkd = QKDProtocol()
 
+#resuming from the last checkpoint
+start = 0
+checkpoint = None
+
+if CHECKPOINT_FILE:
+	checkpoint = Checkpoint(CHECKPOINT_FILE, CHECKPOINT_EVERY, {'protocol': PROTOCOL, 'qubits': NO_OF_QUBITS, 'eve': EVE_EXIST, 'block': BLOCK_SIZE, 'keep': KEEP_QBERS, 'entropy': ENTROPY, 'auth': AUTH_MAC, 'authBatch': AUTH_BATCH, 'rawLog': RAW_LOG, 'trace': TRACE_FILE})
+	state = checkpoint.Load()
+	if state is not None:
+		start = state['cycle']
+		np.random.set_state(state['random'])
+		rng.bit_generator.state = state['rng']
+		if entropy is not None:
+			entropy.SetState(state['entropy'])
+		if authenticator is not None:
+			authenticator = state['authenticator']
+		#the cycles after the checkpoint are recorded again, so the raw log goes back to the checkpoint
+		if rawLog is not None:
+			rawLog.Truncate(state['rawLog'])
+		#the same for the trace file
+		if TRACE_FILE:
+			trace.Truncate(state['trace'])
+		QBERs = state['series']
+		sketch = state['sketch']
+		print("Resuming from cycle", start + 1, "of checkpoint", CHECKPOINT_FILE, datetime.datetime.now())
+
+#cycles are read back by position, so a fresh run does not append to the cycles of another one
+if rawLog is not None and start == 0 and len(rawLog.Index()):
+	raise Exception("Raw log " + RAW_LOG + " already holds " + str(len(rawLog.Index())) + " cycle(s), use a new directory or resume from its checkpoint!")
+
 if SILENT:
 	print("Executing", NO_OF_CYCLES, "Cycle(s) of", NO_OF_QUBITS, "Qubit(s)... Please wait!", datetime.datetime.now())
 
-for i in range(NO_OF_CYCLES):
+for i in range(start, NO_OF_CYCLES):
 	if not SILENT:
 		print("==================================")
 		print("            CYCLE(S)", i + 1, "           ")
@@ -405,41 +432,69 @@ for i in range(NO_OF_CYCLES):
 	#else:
 		#ClearScreen()
 	#	print("Executing", NO_OF_CYCLES, "Cycle(s) of", NO_OF_QUBITS, "Qubit(s)... Please wait!", np.round((i+1)/NO_OF_CYCLES*100,1), "% Completed")
-	qkd.Execute()
+	if BLOCK_SIZE:
+		qkd.ExecuteBlocks(i)
+	else:
+		qkd.Execute(i)
+
+	if checkpoint is not None and (checkpoint.Due(i) or i + 1 == NO_OF_CYCLES):
+		checkpoint.Save(i + 1, random=np.random.get_state(), rng=rng.bit_generator.state, entropy=entropy.State() if entropy is not None else None, authenticator=authenticator, rawLog=rawLog.Sizes() if rawLog is not None else None, trace=trace.Size() if TRACE_FILE else None, series=QBERs, sketch=sketch)
 
 
 if SILENT:
-	print(len(QBERs), "Cycle(s) successfully executed! Generating Plot...", datetime.datetime.now())
+	print(sketch.count, "Cycle(s) successfully executed! Generating Plot...", datetime.datetime.now())
+
+#no QBER when no qubit is successfully transferred in any cycle
+if sketch.count:
+	avg = np.round(sketch.Mean(),2)
+	print("Avg. QBER =", avg, "≈", int(np.round(avg,0)), datetime.datetime.now())
+	print("QBER p50 =", np.round(sketch.Percentile(50),2), "p99 =", np.round(sketch.Percentile(99),2), "p99.9 =", np.round(sketch.Percentile(99.9),2), "max =", np.round(sketch.Percentile(100),2))
+else:
+	avg = None
+	print("No qubit successfully transferred, no QBER to report!", datetime.datetime.now())
 
-avg = np.round(st.mean(QBERs),2)
-print("Avg. QBER =", avg, "≈", int(np.round(avg,0)), datetime.datetime.now())
+if entropy is not None and entropy.Throughput() is not None:
+	print("Entropy source", ENTROPY, ":", entropy.noOfBytes * 8, "bit(s) at", "%.3e" % entropy.Throughput(), "bit(s)/s")
+
+if authenticator is not None and authenticator.noOfCycles:
+	n = authenticator.noOfCycles
+	print("Secure key/cycle =", int(np.round(authenticator.secureKeyBits / n)), "Authentication key/cycle =", int(np.round(authenticator.keyBits / n)), "Net key/cycle =", int(np.round(authenticator.netKeyBits / n)), "Authentication time/cycle =", "%.3e" % (authenticator.elapsed / n), "s")
+
+if trace is not None:
+	trace.Close()
+
+if rawLog is not None:
+	rawLog.Close()
 
 #exporting results into text file
 qkd.exportDataToFile('bb84_qkd_results', avg)
 
 #plotting results
-df = pd.DataFrame({'cycle': range(len(QBERs)), 'qber': QBERs})
+if KEEP_QBERS:
+	df = pd.DataFrame({'cycle': range(len(QBERs)), 'qber': QBERs})
+
+	for x in range(len(QBERs)):
+		scatterPlot = plt.scatter(x, QBERs[x], c=(0,0,1), s=7, label='QBER')
 
-for x in range(len(QBERs)):
-	scatterPlot = plt.scatter(x, QBERs[x], c=(0,0,1), s=7, label='QBER')
+	if len(QBERs) > 1:
+		x1 = np.array(df['cycle'])
+		y1 = np.array(df['qber'])
+		z = np.polyfit(x1, y1, 1)
+		p = np.poly1d(z)
+		linePlot = plt.plot(x1, p(x1), "r--", label='Avg. QBER')
 
-if NO_OF_CYCLES > 1:
-	x1 = np.array(df['cycle'])
-	y1 = np.array(df['qber'])
-	z = np.polyfit(x1, y1, 1)
-	p = np.poly1d(z)
-	linePlot = plt.plot(x1, p(x1), "r--", label='Avg. QBER')
+	plt.xlabel("CYCLE(S)")
+	plt.ylabel("QBER (%)")
+	plt.title("QBER of " + PROTOCOL_NAMES[PROTOCOL] + " for " + str(len(QBERs)) + " Cycle(s) of " + str(NO_OF_QUBITS) + " Qubit(s) Per Cycle")
 
-plt.xlabel("CYCLE(S)")
-plt.ylabel("QBER (%)")
-plt.title("QBER of BB84 for " + str(len(QBERs)) + " Cycle(s) of " + str(NO_OF_QUBITS) + " Qubit(s) Per Cycle")
+	handles, labels = plt.gca().get_legend_handles_labels()
+	by_label = OrderedDict(zip(labels, handles))
 
-handles, labels = plt.gca().get_legend_handles_labels()
-by_label = OrderedDict(zip(labels, handles))
+	plt.legend(by_label.values(), by_label.keys())
+	plt.yticks(np.arange(0, 100 + 1, 5))
+	plt.grid(axis='y', linestyle='-')
 
-plt.legend(by_label.values(), by_label.keys())
-plt.yticks(np.arange(0, 100 + 1, 5))
-plt.grid(axis='y', linestyle='-')
+sketch.Plot("QBER Distribution of " + PROTOCOL_NAMES[PROTOCOL] + " for " + str(sketch.count) + " Cycle(s) of " + str(NO_OF_QUBITS) + " Qubit(s) Per Cycle")
 plt.show()
 
 #===================================================================
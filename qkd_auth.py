@@ -0,0 +1,258 @@
+#!/usr/bin/python
+
+"""
+
+@title		: Wegman-Carter authentication of the classical channel & its cost in key and time
+
+"""
+
+import numpy as np
+import time
+
+"""
+Wegman-Carter tag of a message m:
+- h_k is an almost universal hash of a pre-shared key k, which is reused
+- r is a one-time pad of the tag length, consumed by every tag
+
+Hash families:
+polynomial : m cut into 16-bit words m_1..m_L (and its length appended),
+             h_k(m) = sum m_i k^(L+1-i) mod p with p = 2^31 - 1, one 31-bit lane
+             per independent key k, tag = h_k(m) + r mod p,
+             collision probability ((L + 1) / p)^lanes
+toeplitz   : h_k(m) = T m over GF(2) with a seeded Toeplitz matrix T: its
+             message bits + tag bits - 1 diagonals are expanded from a
+             TOEPLITZ_SEED_BITS seed, the seed is the hash key charged,
+             tag = h_k(m) XOR r, collision probability 2^-tag bits for
+             the expanded T (computational, not information-theoretic,
+             as the expansion is a PRG)
+
+A message is hashed in chunks of CHUNK bytes, so memory does not grow with the
+size of the message: the polynomial hash by Horner's rule with k^(words of a
+chunk), the Toeplitz hash with the window of T over the chunk. The diagonals
+of T are expanded block by block from the seed, only the blocks of the
+current window are held.
+
+The messages of a cycle are tagged in batches: the messages of a batch are
+concatenated and share one tag & one pad. The key consumed is the pads of
+all tags and the hash key the first time it is used. The time spent is the
+wall-clock time (perf_counter) of hashing.
+
+Classical messages of a cycle of n qubits with s sifted bits & error rate e:
+basis announcement    : n x announced bits: Bob's basis (BB84), Alice's index &
+                        pair of basis (KMB09)
+sifting               : Alice's matching flags, n bits
+error estimation      : a sample of SAMPLE_FRACTION of the sifted key
+error correction      : syndromes, EC_EFFICIENCY H(e) of the kept key
+privacy amplification : Toeplitz seed of the length of the kept key
+confirmation          : a hash of the corrected key, CONFIRMATION_BITS
+
+Secure key: kept key (1 - EC_EFFICIENCY H(e) - H(e)), the net key of the cycle
+is the secure key less the key consumed by its authentication. The payloads
+tagged are random bytes of the size of each message, drawn chunk by chunk from
+the authenticator's own generator: the cost does not depend on the content.
+"""
+
+P = np.uint64(2**31 - 1)
+
+#bytes of a message hashed at once
+CHUNK = 1 << 13
+
+#fraction of the sifted key disclosed for error estimation
+SAMPLE_FRACTION = 0.1
+
+#bits of the key confirmation hash
+CONFIRMATION_BITS = 64
+
+#error correction efficiency
+EC_EFFICIENCY = 1.22
+
+#bits of the seed of the Toeplitz matrix, the hash key of the Toeplitz MAC
+TOEPLITZ_SEED_BITS = 64
+
+#binary entropy
+def H2(x):
+	x = np.clip(x, 1e-15, 1 - 1e-15)
+	return -x * np.log2(x) - (1 - x) * np.log2(1 - x)
+
+#multiplication modulo p of values below p, the product fits 62 bits
+def MulMod(a, b):
+	return (a * b) % P
+
+#sizes (bits) of the classical messages of one cycle
+#announcedBits is the size of the announcement of one qubit
+def CycleMessages(noOfQubits, announcedBits, siftedBits, errorRate):
+	messages = {"basis announcement": noOfQubits * announcedBits, "sifting": noOfQubits}
+	if siftedBits:
+		sample = int(np.round(siftedBits * SAMPLE_FRACTION))
+		kept = siftedBits - sample
+		messages["error estimation"] = sample
+		messages["error correction"] = int(np.ceil(EC_EFFICIENCY * H2(errorRate) * kept))
+		messages["privacy amplification"] = kept
+		messages["confirmation"] = CONFIRMATION_BITS
+	return messages
+
+#secure key bits of the sifted key after error estimation, correction & privacy amplification
+def SecureKey(siftedBits, errorRate):
+	if not siftedBits:
+		return 0
+	kept = siftedBits - int(np.round(siftedBits * SAMPLE_FRACTION))
+	return max(int(kept * (1 - EC_EFFICIENCY * H2(errorRate) - H2(errorRate))), 0)
+
+#This class is used for the Wegman-Carter authentication of the classical messages & its accounting
+#class start "Authenticator"
+class Authenticator():
+
+	#initialization, mac is 'polynomial' or 'toeplitz', batch is the no. of messages per tag
+	#rng is the authenticator's own generator, apart from the one of the simulation
+	def __init__(self,mac='polynomial',tagBits=62,batch=16,rng=None):
+		assert batch > 0, "Batch must be positive!"
+		self.mac = mac
+		self.batch = batch
+		self.rng = rng if rng is not None else np.random.default_rng()
+
+		if mac == 'polynomial':
+			self.lanes = (tagBits + 30) // 31
+			self.tagBits = 31 * self.lanes
+			self.keys = self.rng.integers(1, int(P), self.lanes, dtype=np.uint64)
+			#powers k^0..k^(CHUNK/2) of every lane
+			powers = np.ones((self.lanes, CHUNK // 2 + 1), dtype=np.uint64)
+			for i in range(1, CHUNK // 2 + 1):
+				powers[:, i] = MulMod(powers[:, i - 1], self.keys)
+			self.powers = powers
+			self.hashKeyBits = self.tagBits
+		elif mac == 'toeplitz':
+			self.tagBits = tagBits
+			self.toeplitzSeed = int(self.rng.integers(0, 2**TOEPLITZ_SEED_BITS, dtype=np.uint64))
+			self.keyBlocks = dict()
+			self.hashKeyBits = TOEPLITZ_SEED_BITS
+		else:
+			raise Exception("Unknown MAC " + str(mac))
+
+		#the hash key is charged when it is first used
+		self.keyBits = 0
+		self.chargedKeyBits = 0
+		self.elapsed = 0.0
+		self.noOfTags = 0
+		self.messageBits = 0
+		self.noOfCycles = 0
+		self.secureKeyBits = 0
+		self.netKeyBits = 0
+
+	#polynomial hash of the message chunks by Horner's rule, one 31-bit value per lane
+	def __Polynomial(self,chunks):
+		h = np.zeros(self.lanes, dtype=np.uint64)
+		length = 0
+		carry = np.zeros(0, dtype=np.uint8)
+		for chunk in chunks:
+			length += len(chunk)
+			data = np.concatenate((carry, chunk)) if len(carry) else chunk
+			for start in range(0, len(data) - len(data) % 2, CHUNK):
+				words = data[start:min(start + CHUNK, len(data) - len(data) % 2)].view('<u2').astype(np.uint64)
+				h = self.__Horner(h, words)
+			carry = data[len(data) - len(data) % 2:]
+		if len(carry):
+			h = self.__Horner(h, np.array([carry[0]], dtype=np.uint64))
+		#the length is the last coefficient, so messages of different length do not collide
+		return self.__Horner(h, np.array([length], dtype=np.uint64) % P)
+
+	#h k^c + sum w_i k^(c+1-i) mod p of the c words w
+	def __Horner(self,h,words):
+		c = len(words)
+		powers = self.powers[:, c:0:-1]
+		return (MulMod(h, self.powers[:, c]) + np.sum((words * powers) % P, axis=1)) % P
+
+	#diagonals start..stop of the Toeplitz matrix, expanded block by block from the seed
+	def __ToeplitzKey(self,start,stop):
+		first = start // (8 * CHUNK)
+		last = (stop - 1) // (8 * CHUNK)
+		for j in range(first, last + 1):
+			if j not in self.keyBlocks:
+				self.keyBlocks[j] = np.random.default_rng([self.toeplitzSeed, j]).integers(0, 2, 8 * CHUNK, dtype=np.uint8)
+		#only the blocks of the current window are kept
+		for j in [j for j in self.keyBlocks if j < first]:
+			del self.keyBlocks[j]
+		key = np.concatenate([self.keyBlocks[j] for j in range(first, last + 1)])
+		return key[start - first * 8 * CHUNK:stop - first * 8 * CHUNK]
+
+	#Toeplitz hash of the message chunks, tagBits bits, a window of the key per chunk of columns of T
+	def __Toeplitz(self,chunks):
+		counts = np.zeros(self.tagBits, dtype=np.int64)
+		position = 0
+		for chunk in chunks:
+			for start in range(0, len(chunk), CHUNK):
+				x = np.unpackbits(chunk[start:start + CHUNK])
+				#row i of T holds the key bits i..i+m-1, the chunk is a window of its columns
+				window = np.lib.stride_tricks.sliding_window_view(self.__ToeplitzKey(position, position + len(x) + self.tagBits - 1), len(x))
+				counts += np.rint(window.astype(np.float32) @ x.astype(np.float32)).astype(np.int64)
+				position += len(x)
+		self.keyBlocks = dict()
+		return np.packbits(counts & 1)
+
+	#Wegman-Carter tag of one message given as byte chunks (uint8 arrays): the hash with a one-time pad
+	def Tag(self,chunks):
+		start = time.perf_counter()
+		noOfBytes = [0]
+		def Counted(chunks):
+			for chunk in chunks:
+				noOfBytes[0] += len(chunk)
+				yield chunk
+		if self.mac == 'polynomial':
+			tag = (self.__Polynomial(Counted(chunks)) + self.rng.integers(0, int(P), self.lanes, dtype=np.uint64)) % P
+		else:
+			tag = self.__Toeplitz(Counted(chunks)) ^ np.packbits(self.rng.integers(0, 2, self.tagBits, dtype=np.uint8))
+		self.elapsed += time.perf_counter() - start
+
+		self.keyBits += self.tagBits + self.hashKeyBits - self.chargedKeyBits
+		self.chargedKeyBits = self.hashKeyBits
+		self.noOfTags += 1
+		self.messageBits += noOfBytes[0] * 8
+		return tag
+
+	#random payload of no_of_bytes in chunks, generated outside of the hashing time
+	def __Payload(self,no_of_bytes):
+		for start in range(0, no_of_bytes, CHUNK):
+			begin = time.perf_counter()
+			chunk = self.rng.integers(0, 256, min(CHUNK, no_of_bytes - start), dtype=np.uint8)
+			self.elapsed -= time.perf_counter() - begin
+			yield chunk
+
+	#tagging the messages of the sizes (bits) in batches, one tag per batch of concatenated messages
+	def Authenticate(self,sizes):
+		tags = list()
+		for i in range(0, len(sizes), self.batch):
+			tags.append(self.Tag(self.__Payload(sum((bits + 7) // 8 for bits in sizes[i:i + self.batch]))))
+		return tags
+
+	#collision probability of a tag of a message of messageBits
+	def Epsilon(self,messageBits):
+		if self.mac == 'polynomial':
+			return ((messageBits / 16 + 2) / float(P)) ** self.lanes
+		return 2.0 ** -self.tagBits
+
+	#authenticating the classical messages of one cycle, returns the net key, key consumed & time spent
+	def Cycle(self,noOfQubits,announcedBits,siftedBits,errorRate):
+		keyBits = self.keyBits
+		elapsed = self.elapsed
+		self.Authenticate(list(CycleMessages(noOfQubits, announcedBits, siftedBits, errorRate).values()))
+
+		consumed = self.keyBits - keyBits
+		secure = SecureKey(siftedBits, errorRate)
+		self.noOfCycles += 1
+		self.secureKeyBits += secure
+		self.netKeyBits += secure - consumed
+		return secure - consumed, consumed, self.elapsed - elapsed
+#class end "Authenticator"
+
+if __name__ == "__main__":
+	from qkd_batch import StreamCycle
+
+	rng = np.random.default_rng()
+	print("MAC          Batch   Secure/cycle  Auth key/cycle  Net key/cycle  Auth time/cycle (s)")
+	for mac in ('polynomial', 'toeplitz'):
+		for batch in (1, 16):
+			authenticator = Authenticator(mac, 62, batch, rng.spawn(1)[0])
+			for i in range(10):
+				result = StreamCycle('bb84', 10**6, 1 << 18, False, rng)
+				authenticator.Cycle(result.noOfQubits, 1, result.siftedBits, result.errorBits / result.siftedBits)
+			n = authenticator.noOfCycles
+			print(mac.ljust(12), str(batch).ljust(7), str(int(np.round(authenticator.secureKeyBits / n))).ljust(13), str(int(np.round(authenticator.keyBits / n))).ljust(15), str(int(np.round(authenticator.netKeyBits / n))).ljust(14), "%.3e" % (authenticator.elapsed / n))
@@ -0,0 +1,282 @@
+#!/usr/bin/python
+
+"""
+
+@title		: Batch engine of the QKD simulations, one cycle processed in fixed-size blocks
+
+"""
+
+import numpy as np
+
+from qkd_kernel import HAVE_NUMBA, SIFT_BASIS, SIFT_INDEX, SIFT_CONCLUSIVE, JitBlock
+
+"""
+The batch engine keeps the Qubit/User model of the scripts, but for a whole
+block of qubits at once: a qubit is the pair (basis, bit) it was prepared from,
+and a measurement samples its outcome exactly from the overlap of that state
+with the measurement basis. With Numba installed a block of the 2-basis
+protocols (BB84, KMB09, B92) runs in the compiled kernel of qkd_kernel.py,
+otherwise on NumPy arrays. The rng is the numpy Generator of the simulation,
+an optional entropy source of qkd_entropy.py supplies the basis & bits of
+Alice, Eve & Bob (the choices of the users) while the measurement outcomes
+stay with the rng, so the source is charged for the choices only.
+
+Adding a protocol is a table of its prepared states, the states Eve re-sends,
+its no. of basis and a block function with its sifting rule.
+
+A cycle of NO_OF_QUBITS is cut into blocks of BLOCK_SIZE, every block runs
+prepare -> intercept -> measure -> sift and only the sifted key (handed to an
+optional sink) and the error counts are carried to the next block. Peak memory
+is a few bytes per qubit of one block, whatever the size of the cycle.
+"""
+
+#single qubit states |0>, |1>, |0> + |1>, |0> - |1>, |0> + i|1> & |0> - i|1>
+ZERO = np.array([1.0, 0.0], dtype=complex)
+ONE = np.array([0.0, 1.0], dtype=complex)
+PLUS = np.array([1.0, 1.0], dtype=complex) / np.sqrt(2)
+MINUS = np.array([1.0, -1.0], dtype=complex) / np.sqrt(2)
+PLUS_I = np.array([1.0, 1.0j]) / np.sqrt(2)
+MINUS_I = np.array([1.0, -1.0j]) / np.sqrt(2)
+
+#measurement basis, indexed by [basis][outcome]: 0 -> standard, 1 -> hadamard, 2 -> Y basis
+MEASUREMENT = np.array([[ZERO, ONE], [PLUS, MINUS], [PLUS_I, MINUS_I]])
+
+#prepared states of each protocol, indexed by [basis][bit] as in User.SendQubits
+#B92 encodes the bit in |0> or |0> + |1> whatever the basis
+STATES = {
+	"bb84"		: np.array([[ZERO, ONE], [PLUS, MINUS]]),
+	"kmb09"		: np.array([[ZERO, ZERO], [MINUS, MINUS]]),
+	"b92"		: np.array([[ZERO, PLUS], [ZERO, PLUS]]),
+	"sixstate"	: MEASUREMENT,
+}
+
+#states re-sent by Eve: her own encoding in the scripts, the eigenstate she measured otherwise
+RESEND = {
+	"bb84"		: STATES["bb84"],
+	"kmb09"		: STATES["kmb09"],
+	"b92"		: MEASUREMENT[:2],
+	"sixstate"	: MEASUREMENT,
+}
+
+#no. of basis of Alice, Eve & Bob
+NO_OF_BASES = {
+	"bb84"		: 2,
+	"kmb09"		: 2,
+	"b92"		: 2,
+	"sixstate"	: 3,
+}
+
+#probability of outcome 0, indexed by [measurement basis][prepared basis][prepared bit]
+def OutcomeZeroProbability(states):
+	return np.abs(np.einsum('mk,pbk->mpb', MEASUREMENT[:, 0].conj(), states)) ** 2
+
+PROBABILITY = dict((protocol, OutcomeZeroProbability(states)) for protocol, states in STATES.items())
+RESEND_PROBABILITY = dict((protocol, OutcomeZeroProbability(states)) for protocol, states in RESEND.items())
+
+#measuring a block of qubits given as (basis, bits) in the list of measurement basis
+def Measure(probability, listOfBasis, listOfBits, measureBasis, rng):
+	p = probability[measureBasis, listOfBasis, listOfBits]
+	return (rng.random(len(p)) >= p).astype(np.uint8)
+
+#static method for the generation of a block of random bits i.e. 0 & 1
+def GenerateRandomBits(no_of_qubits, rng):
+	return rng.integers(0, 2, no_of_qubits, dtype=np.uint8)
+
+#static method for the generation of a block of random basis out of noOfBases
+def GenerateRandomBasis(no_of_qubits, noOfBases, rng):
+	return rng.integers(0, noOfBases, no_of_qubits, dtype=np.uint8)
+
+#basis & bits chosen by Alice, Eve (None without Eve) & Bob for a block, drawn from source
+def DrawChoices(protocol, no_of_qubits, eveExist, source):
+	noOfBases = NO_OF_BASES[protocol]
+	aliceBasis = GenerateRandomBasis(no_of_qubits, noOfBases, source)
+	aliceBits = GenerateRandomBits(no_of_qubits, source)
+	bobBasis = GenerateRandomBasis(no_of_qubits, noOfBases, source)
+	eveBasis = GenerateRandomBasis(no_of_qubits, noOfBases, source) if eveExist else None
+	return aliceBasis, aliceBits, eveBasis, bobBasis
+
+#prepare -> intercept -> measure of a block, returns the basis & bits of Alice, Eve (None without Eve) & Bob
+#the choices are drawn from entropy (rng without one), the measurement outcomes from rng
+def Transmit(protocol, no_of_qubits, eveExist, rng, entropy=None):
+	probability = PROBABILITY[protocol]
+	aliceBasis, aliceBits, eveBasis, bobBasis = DrawChoices(protocol, no_of_qubits, eveExist, rng if entropy is None else entropy)
+	eveBits = None
+
+	if eveExist:
+		eveBits = Measure(probability, aliceBasis, aliceBits, eveBasis, rng)
+		bobBits = Measure(RESEND_PROBABILITY[protocol], eveBasis, eveBits, bobBasis, rng)
+	else:
+		bobBits = Measure(probability, aliceBasis, aliceBits, bobBasis, rng)
+
+	return aliceBasis, aliceBits, eveBasis, eveBits, bobBasis, bobBits
+
+#sifting on the announced basis, returns the sifted keys of Alice & Bob
+def SiftBasis(aliceBasis, aliceBits, bobBasis, bobBits):
+	sifted = aliceBasis == bobBasis
+	return aliceBits[sifted], bobBits[sifted]
+
+#sifting on the announced indeces of KMB09
+#indeces are bit + 1, a mismatch reveals the basis: standard -> 1, hadamard -> 0
+def SiftIndex(aliceBasis, aliceBits, bobBasis, bobBits):
+	sifted = aliceBits != bobBits
+	return aliceBits[sifted], 1 - bobBasis[sifted]
+
+#sifting on the conclusive results of B92
+#|1> in the standard basis excludes |0>, |0> - |1> in the hadamard basis excludes |0> + |1>
+def SiftConclusive(aliceBasis, aliceBits, bobBasis, bobBits):
+	sifted = bobBits == 1
+	return aliceBits[sifted], 1 - bobBasis[sifted]
+
+SIFTING = {
+	"bb84"		: SiftBasis,
+	"kmb09"		: SiftIndex,
+	"b92"		: SiftConclusive,
+	"sixstate"	: SiftBasis,
+}
+
+#one block of a 2-basis protocol in the compiled kernel, the choices drawn from entropy when given
+def CompiledBlock(protocol, sift, no_of_qubits, eveExist, rng, entropy):
+	choices = None
+	if entropy is not None:
+		aliceBasis, aliceBits, eveBasis, bobBasis = DrawChoices(protocol, no_of_qubits, eveExist, entropy)
+		choices = (aliceBasis, aliceBits, eveBasis if eveExist else np.zeros(no_of_qubits, dtype=np.uint8), bobBasis)
+	return JitBlock(PROBABILITY[protocol], RESEND_PROBABILITY[protocol], sift, no_of_qubits, eveExist, rng, choices)
+
+#one block of BB84: prepare -> intercept -> measure -> sift
+def Bb84Block(no_of_qubits, eveExist, rng, entropy=None):
+	if HAVE_NUMBA:
+		return CompiledBlock("bb84", SIFT_BASIS, no_of_qubits, eveExist, rng, entropy)
+
+	aliceBasis, aliceBits, eveBasis, eveBits, bobBasis, bobBits = Transmit("bb84", no_of_qubits, eveExist, rng, entropy)
+	return SiftBasis(aliceBasis, aliceBits, bobBasis, bobBits)
+
+#one block of KMB09: prepare -> intercept -> measure -> sift on the announced indeces
+def Kmb09Block(no_of_qubits, eveExist, rng, entropy=None):
+	if HAVE_NUMBA:
+		return CompiledBlock("kmb09", SIFT_INDEX, no_of_qubits, eveExist, rng, entropy)
+
+	aliceBasis, aliceBits, eveBasis, eveBits, bobBasis, bobBits = Transmit("kmb09", no_of_qubits, eveExist, rng, entropy)
+	return SiftIndex(aliceBasis, aliceBits, bobBasis, bobBits)
+
+#one block of B92: Alice sends |0> for 0 & |0> + |1> for 1, Bob keeps his conclusive results only
+def B92Block(no_of_qubits, eveExist, rng, entropy=None):
+	if HAVE_NUMBA:
+		return CompiledBlock("b92", SIFT_CONCLUSIVE, no_of_qubits, eveExist, rng, entropy)
+
+	aliceBasis, aliceBits, eveBasis, eveBits, bobBasis, bobBits = Transmit("b92", no_of_qubits, eveExist, rng, entropy)
+	return SiftConclusive(aliceBasis, aliceBits, bobBasis, bobBits)
+
+#one block of the six-state protocol: standard, hadamard & Y basis, sifted as BB84
+def SixStateBlock(no_of_qubits, eveExist, rng, entropy=None):
+	aliceBasis, aliceBits, eveBasis, eveBits, bobBasis, bobBits = Transmit("sixstate", no_of_qubits, eveExist, rng, entropy)
+	return SiftBasis(aliceBasis, aliceBits, bobBasis, bobBits)
+
+PROTOCOLS = {
+	"bb84"		: Bb84Block,
+	"kmb09"		: Kmb09Block,
+	"b92"		: B92Block,
+	"sixstate"	: SixStateBlock,
+}
+
+#streams of the raw log of a protocol & their widths in bits
+def RawStreams(protocol):
+	basisWidth = int(NO_OF_BASES[protocol] - 1).bit_length()
+	return {"aliceBasis": basisWidth, "aliceBits": 1, "eveBasis": basisWidth, "eveBits": 1, "bobBasis": basisWidth, "bobBits": 1}
+
+#one block recorded to the raw log: the NumPy path of the block, as the compiled kernel keeps no streams
+def RecordedBlock(protocol, no_of_qubits, eveExist, rng, rawLog, entropy=None):
+	aliceBasis, aliceBits, eveBasis, eveBits, bobBasis, bobBits = Transmit(protocol, no_of_qubits, eveExist, rng, entropy)
+	if eveExist:
+		rawLog.Append(aliceBasis=aliceBasis, aliceBits=aliceBits, eveBasis=eveBasis, eveBits=eveBits, bobBasis=bobBasis, bobBits=bobBits)
+	else:
+		rawLog.Append(aliceBasis=aliceBasis, aliceBits=aliceBits, bobBasis=bobBasis, bobBits=bobBits)
+	return SIFTING[protocol](aliceBasis, aliceBits, bobBasis, bobBits)
+
+#This class is used for the result of one cycle: counts of qubits, sifted bits & errors
+#class start "CycleResult"
+class CycleResult():
+
+	#initialization
+	def __init__(self):
+		self.noOfQubits = 0
+		self.siftedBits = 0
+		self.errorBits = 0
+
+	#adding the counts of one block
+	def Add(self,noOfQubits,aliceKey,bobKey):
+		self.noOfQubits += noOfQubits
+		self.siftedBits += len(aliceKey)
+		self.errorBits += int(np.count_nonzero(aliceKey != bobKey))
+
+	#QBER in %, None when no qubit is successfully transferred
+	def QBER(self):
+		if not self.siftedBits:
+			return None
+		return np.round((self.errorBits / self.siftedBits),5)*100
+#class end "CycleResult"
+
+#executing one cycle of no_of_qubits in blocks of block_size, keySink(aliceKey, bobKey) receives the sifted key of each block
+#protocol is a name of PROTOCOLS or the block method of an engine, e.g. Kmb09Engine(d, N).Block
+#rawLog (a RawLog of RawStreams(protocol)) records the bases & bits of every qubit of the cycle
+#entropy (an entropy source) supplies the basis & bits of the users, None to draw them from rng
+def StreamCycle(protocol, no_of_qubits, block_size, eveExist, rng, keySink=None, rawLog=None, cycle=0, entropy=None):
+	assert block_size > 0, "Block size must be positive!"
+	if rawLog is not None:
+		assert isinstance(protocol, str), "Only the protocols of PROTOCOLS can be recorded!"
+		block = lambda n, eveExist, rng, entropy: RecordedBlock(protocol, n, eveExist, rng, rawLog, entropy)
+		rawLog.BeginCycle(cycle)
+	else:
+		block = PROTOCOLS[protocol] if isinstance(protocol, str) else protocol
+	result = CycleResult()
+	remaining = no_of_qubits
+
+	while remaining > 0:
+		n = min(block_size, remaining)
+		aliceKey, bobKey = block(n, eveExist, rng, entropy)
+		result.Add(n, aliceKey, bobKey)
+		if keySink is not None:
+			keySink(aliceKey, bobKey)
+		remaining -= n
+
+	if rawLog is not None:
+		rawLog.EndCycle()
+	return result
+
+#sifting the cycle at index position i of the raw log again, block by block from the memory-mapped streams
+def Replay(protocol, rawLog, i, block_size, keySink=None):
+	result = CycleResult()
+	for streams in rawLog.Blocks(i, block_size):
+		aliceKey, bobKey = SIFTING[protocol](streams["aliceBasis"], streams["aliceBits"], streams["bobBasis"], streams["bobBits"])
+		result.Add(len(streams["aliceBits"]), aliceKey, bobKey)
+		if keySink is not None:
+			keySink(aliceKey, bobKey)
+	return result
+
+#Eve's intercepts of the cycle at index position i of the raw log: qubits intercepted in Alice's basis & those of them read correctly
+def Intercepts(rawLog, i, block_size):
+	assert rawLog.Recorded("eveBasis", i), "Eve is not recorded in the cycle!"
+	sameBasis = 0
+	correct = 0
+	for streams in rawLog.Blocks(i, block_size):
+		same = streams["eveBasis"] == streams["aliceBasis"]
+		sameBasis += int(np.count_nonzero(same))
+		correct += int(np.count_nonzero(same & (streams["eveBits"] == streams["aliceBits"])))
+	return sameBasis, correct
+
+#running every protocol side by side on the batch engine: QBER, sifted fraction & throughput
+def Benchmark(no_of_qubits, block_size, eveExist, rng):
+	import time
+
+	print("Protocol   Qubit(s)      Sifted     QBER (%)   Qubit(s)/s")
+	for protocol in PROTOCOLS:
+		start = time.perf_counter()
+		result = StreamCycle(protocol, no_of_qubits, block_size, eveExist, rng)
+		elapsed = time.perf_counter() - start
+		qber = result.QBER()
+		print(protocol.ljust(10), str(result.noOfQubits).ljust(13), str(np.round(result.siftedBits / result.noOfQubits, 4)).ljust(10), str(None if qber is None else np.round(qber, 3)).ljust(10), "%.3e" % (result.noOfQubits / elapsed))
+
+if __name__ == "__main__":
+	for eveExist in (False, True):
+		print("Eve exist:", eveExist)
+		Benchmark(10**7, 1 << 20, eveExist, np.random.default_rng())
+		print(" ")
@@ -0,0 +1,82 @@
+#!/usr/bin/python
+
+"""
+
+@title		: Atomic checkpoints of the run progress of the QKD simulations
+
+"""
+
+import numpy as np
+import pickle
+import os
+
+"""
+A checkpoint is one pickled dict: the configuration of the run, the next cycle
+to execute and whatever state the script hands over (RNG states, QBERs, sketch).
+It is written to a temporary file which is fsync'ed and renamed over the
+previous checkpoint, so a crash or preemption at any point leaves either the
+old or the new checkpoint on disk, never a torn one.
+
+A series that only grows over the run (the QBER of every cycle) is not
+pickled again at every checkpoint: its new values are appended to
+<fileName>.series (float64) and the checkpoint holds its length, so the I/O
+of a checkpoint does not grow with the run. Values appended after the last
+checkpoint are cut off when it is loaded.
+"""
+
+#This class is used for the checkpoint methods: saving & loading the progress of a run
+#class start "Checkpoint"
+class Checkpoint():
+
+	#initialization, config identifies the run, a checkpoint of another run is refused
+	def __init__(self,fileName,every,config):
+		assert every > 0, "Checkpoint interval must be positive!"
+		self.fileName = fileName
+		self.seriesFile = fileName + ".series"
+		self.every = every
+		self.config = config
+		self.__written = 0
+
+	#checkpoint due after the cycle
+	def Due(self,cycle):
+		return (cycle + 1) % self.every == 0
+
+	#appending the values of series not written yet
+	def __Extend(self,series):
+		with open(self.seriesFile, 'ab') as seriesFile:
+			np.asarray(series[self.__written:], dtype=np.float64).tofile(seriesFile)
+			seriesFile.flush()
+			os.fsync(seriesFile.fileno())
+		self.__written = len(series)
+
+	#saving the state with cycle as the next cycle to execute, series is the list of values appended since the start
+	def Save(self,cycle,series=None,**state):
+		if series is not None:
+			self.__Extend(series)
+			state["seriesLength"] = len(series)
+		state["config"] = self.config
+		state["cycle"] = cycle
+		temp = self.fileName + ".tmp"
+		with open(temp, 'wb') as checkpointFile:
+			pickle.dump(state, checkpointFile, protocol=pickle.HIGHEST_PROTOCOL)
+			checkpointFile.flush()
+			os.fsync(checkpointFile.fileno())
+		os.replace(temp, self.fileName)
+
+	#loading the last checkpoint, None when there is none yet, the series (if saved) is state["series"]
+	def Load(self):
+		if not os.path.exists(self.fileName):
+			#a series without its checkpoint is left over from a run that never checkpointed
+			if os.path.exists(self.seriesFile):
+				os.remove(self.seriesFile)
+			return None
+		with open(self.fileName, 'rb') as checkpointFile:
+			state = pickle.load(checkpointFile)
+		if state["config"] != self.config:
+			raise Exception("Checkpoint " + self.fileName + " belongs to another run: " + str(state["config"]))
+		if "seriesLength" in state:
+			self.__written = state.pop("seriesLength")
+			os.truncate(self.seriesFile, self.__written * 8)
+			state["series"] = np.fromfile(self.seriesFile, dtype=np.float64).tolist()
+		return state
+#class end "Checkpoint"
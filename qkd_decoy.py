@@ -0,0 +1,197 @@
+#!/usr/bin/python
+
+"""
+
+@title		: Decoy-state BB84 with weak coherent pulses, photon-number splitting Eve & key rate bounds
+
+"""
+
+import numpy as np
+
+"""
+Decoy-state BB84 (weak + vacuum decoy, Ma, Qi, Zhao & Lo 2005):
+
+Every pulse is a signal (mu), decoy (nu) or vacuum pulse of an attenuated
+laser with a Poisson number of photons. Photon numbers, channel losses, dark
+counts, misalignment errors and the sifting are sampled in bulk for a block of
+pulses, and only the counts per intensity are carried between blocks:
+pulses, clicks, sifted clicks & errors.
+
+From the counts:
+	gain Q_k = clicks / pulses,   error rate E_k = errors / sifted clicks
+	Y0      ~ Q_vacuum
+	Y1 >= Y1_L = mu / (mu nu - nu^2) (Q_nu e^nu - Q_mu e^mu nu^2 / mu^2 - (mu^2 - nu^2) / mu^2 Y0)
+	Q1 >= Q1_L = Y1_L mu e^-mu
+	e1 <= e1_U = (E_nu Q_nu e^nu - Y0 / 2) / (Y1_L nu)
+	R  >= q (-Q_mu f H(E_mu) + Q1_L (1 - H(e1_U)))   secure bits per signal pulse
+
+The photon-number splitting Eve keeps one photon of every multi-photon pulse
+& forwards the rest over a lossless line, and blocks just enough single-photon
+pulses that the signal gain matches the real channel. She causes no errors,
+but the decoy gain exposes her: the bound on Y1 collapses and so does the rate.
+Where she would have to forward single photons more often than the channel
+delivers them (short distances) the attack is not feasible & the pulses take
+the channel, so the attack never improves the bound.
+
+Channel defaults are those of the GYS experiment used in the decoy-state papers.
+"""
+
+SIGNAL = 0
+DECOY = 1
+VACUUM = 2
+
+#mean photon numbers of the signal, decoy & vacuum pulses & the probability of sending each
+INTENSITIES = (0.48, 0.05, 0.0)
+PROBABILITIES = (0.8, 0.1, 0.1)
+
+#fiber loss (dB/km), detection efficiency of Bob, dark count rate, misalignment error & error correction efficiency
+ATTENUATION = 0.21
+BOB_EFFICIENCY = 0.045
+DARK_COUNT = 1.7e-6
+MISALIGNMENT = 0.033
+EC_EFFICIENCY = 1.22
+
+#binary entropy
+def H2(x):
+	x = np.clip(x, 1e-15, 1 - 1e-15)
+	return -x * np.log2(x) - (1 - x) * np.log2(1 - x)
+
+#overall transmittance of the channel & Bob's detector at distance (km)
+def Transmittance(distance):
+	return 10 ** (-ATTENUATION * distance / 10) * BOB_EFFICIENCY
+
+#fractions of the single & multi-photon pulses Eve forwards so that the signal gain matches the channel
+#None when PNS is not feasible (short distances): forwarding every pulse falls short of the channel's gain,
+#or the single photons she must forward would arrive more often than over the channel
+def PnsForwarding(intensity, distance):
+	n = np.arange(1, 60)
+	poisson = np.exp(-intensity + n * np.log(intensity) - np.cumsum(np.log(n)))
+	target = 1 - (1 - DARK_COUNT) * np.exp(-Transmittance(distance) * intensity) - DARK_COUNT
+	single = poisson[0] * BOB_EFFICIENCY
+	multi = np.sum(poisson[1:] * (1 - (1 - BOB_EFFICIENCY) ** (n[1:] - 1)))
+	if target > single + multi:
+		return None
+	if target >= multi:
+		forwardSingle = (target - multi) / single
+		if forwardSingle * BOB_EFFICIENCY > Transmittance(distance):
+			return None
+		return forwardSingle, 1.0
+	return 0.0, target / multi
+
+#Poisson photon numbers of mean intensity by inversion of the uniform variates u, one comparison pass per photon number
+def SamplePhotons(intensity, u):
+	photons = np.zeros(len(u), dtype=np.uint8)
+	if not len(u):
+		return photons
+	largest = u.max()
+	p = np.exp(-intensity)
+	cdf = p
+	n = 0
+	while cdf <= largest and p > 0 and n < 255:
+		photons += u >= cdf
+		n += 1
+		p *= intensity / n
+		cdf += p
+	return photons
+
+#one block of decoy-state BB84, returns the counts [intensity][pulses, clicks, sifted clicks, errors]
+#the pulses are independent, so the block is drawn grouped by intensity from the multinomial no. of pulses of each
+def DecoyBlock(no_of_pulses, distance, eveExist, rng, intensities=INTENSITIES, probabilities=PROBABILITIES):
+	noOfPulses = rng.multinomial(no_of_pulses, probabilities)
+	photons = np.concatenate([SamplePhotons(mu, rng.random(n)) for mu, n in zip(intensities, noOfPulses)])
+	aliceBasis = rng.integers(0, 2, no_of_pulses, dtype=np.uint8)
+	bobBasis = rng.integers(0, 2, no_of_pulses, dtype=np.uint8)
+
+	forwarding = PnsForwarding(intensities[SIGNAL], distance) if eveExist else None
+
+	if forwarding is not None:
+		#Eve keeps one photon of the multi-photon pulses, the rest travels without loss
+		forwardSingle, forwardMulti = forwarding
+		forwarded = rng.random(no_of_pulses) < np.where(photons >= 2, forwardMulti, forwardSingle)
+		photons = (photons - (photons >= 2)) * forwarded
+		efficiency = BOB_EFFICIENCY
+	else:
+		efficiency = Transmittance(distance)
+
+	#probability that at least one of n photons is detected, looked up by photon number
+	photonClick = rng.random(no_of_pulses) < (1 - (1 - efficiency) ** np.arange(256))[photons]
+	click = photonClick | (rng.random(no_of_pulses) < DARK_COUNT)
+	sifted = click & (aliceBasis == bobBasis)
+
+	#a photon gives Alice's bit up to misalignment, a dark count a random bit
+	flip = np.where(photonClick, rng.random(no_of_pulses) < MISALIGNMENT, rng.random(no_of_pulses) < 0.5)
+	errors = sifted & flip
+
+	counts = np.zeros((len(intensities), 4), dtype=np.int64)
+	counts[:, 0] = noOfPulses
+	bounds = np.concatenate([[0], np.cumsum(noOfPulses)])
+	for k in range(len(intensities)):
+		segment = slice(bounds[k], bounds[k + 1])
+		counts[k, 1:] = [np.count_nonzero(click[segment]), np.count_nonzero(sifted[segment]), np.count_nonzero(errors[segment])]
+	return counts
+
+#This class is used for the result of decoy-state BB84: counts per intensity, gains, error rates & key rate bounds
+#class start "DecoyResult"
+class DecoyResult():
+
+	#initialization
+	def __init__(self,intensities=INTENSITIES):
+		self.intensities = intensities
+		self.counts = np.zeros((len(intensities), 4), dtype=np.int64)
+
+	def Add(self,counts):
+		self.counts += counts
+
+	#merging the result of another worker
+	def Merge(self,other):
+		self.counts += other.counts
+
+	#gain of the intensity k
+	def Gain(self,k):
+		return self.counts[k, 1] / self.counts[k, 0]
+
+	#error rate of the intensity k
+	def ErrorRate(self,k):
+		return self.counts[k, 3] / self.counts[k, 2] if self.counts[k, 2] else 0.5
+
+	#lower bound of the single-photon yield & gain, upper bound of the single-photon error rate
+	def Bounds(self):
+		mu, nu = self.intensities[SIGNAL], self.intensities[DECOY]
+		Y0 = self.Gain(VACUUM)
+		Qmu, Qnu = self.Gain(SIGNAL), self.Gain(DECOY)
+		Y1 = mu / (mu * nu - nu ** 2) * (Qnu * np.exp(nu) - Qmu * np.exp(mu) * nu ** 2 / mu ** 2 - (mu ** 2 - nu ** 2) / mu ** 2 * Y0)
+		Y1 = max(Y1, 0.0)
+		Q1 = Y1 * mu * np.exp(-mu)
+		e1 = min((self.ErrorRate(DECOY) * Qnu * np.exp(nu) - Y0 / 2) / (Y1 * nu), 0.5) if Y1 > 0 else 0.5
+		return Y0, Y1, Q1, max(e1, 0.0)
+
+	#secure key rate lower bound (bits per signal pulse), 0 when no key can be distilled
+	def KeyRate(self,q=0.5):
+		Y0, Y1, Q1, e1 = self.Bounds()
+		Qmu, Emu = self.Gain(SIGNAL), self.ErrorRate(SIGNAL)
+		return max(q * (-Qmu * EC_EFFICIENCY * H2(Emu) + Q1 * (1 - H2(e1))), 0.0)
+#class end "DecoyResult"
+
+#executing no_of_pulses of decoy-state BB84 at distance (km) in blocks of block_size
+def StreamDecoy(no_of_pulses, block_size, distance, eveExist, rng, intensities=INTENSITIES, probabilities=PROBABILITIES):
+	assert block_size > 0, "Block size must be positive!"
+	result = DecoyResult(intensities)
+	remaining = no_of_pulses
+
+	while remaining > 0:
+		n = min(block_size, remaining)
+		result.Add(DecoyBlock(n, distance, eveExist, rng, intensities, probabilities))
+		remaining -= n
+
+	return result
+
+#sweeping the distances (km) for one setting of intensities, returns the key rate at each distance
+def Sweep(distances, no_of_pulses, block_size, eveExist, rng, intensities=INTENSITIES, probabilities=PROBABILITIES):
+	return [StreamDecoy(no_of_pulses, block_size, distance, eveExist, rng, intensities, probabilities).KeyRate() for distance in distances]
+
+if __name__ == "__main__":
+	rng = np.random.default_rng()
+	distances = range(0, 161, 20)
+	print("Distance (km)   Key Rate        Key Rate (PNS Eve)")
+	for distance, rate, eveRate in zip(distances, Sweep(distances, 10**8, 1 << 22, False, rng), Sweep(distances, 10**8, 1 << 22, True, rng)):
+		print(str(distance).ljust(15), ("%.3e" % rate).ljust(15), "%.3e" % eveRate)
@@ -0,0 +1,164 @@
+#!/usr/bin/python
+
+"""
+
+@title		: Entanglement-based E91 on the batch engine with CHSH evaluation from bulk counts
+
+"""
+
+import numpy as np
+
+"""
+E91 (Ekert 1991) with the singlet (|01> - |10>)/sqrt(2):
+
+Alice measures along 0, pi/4 or pi/2, Bob along pi/4, pi/2 or 3pi/4 (angles in
+the x-z plane of the Bloch sphere), the basis of angle t being
+	|t,0> = cos(t/2)|0> + sin(t/2)|1>,   |t,1> = -sin(t/2)|0> + cos(t/2)|1>
+so that the correlation of the outcomes is E(a,b) = -cos(a - b).
+
+- CHSH: S = E(a1,b1) - E(a1,b3) + E(a3,b1) + E(a3,b3), -2 sqrt(2) for the singlet,
+  |S| <= 2 for any local (e.g. intercepted) pair
+- key : the pairs measured along the same angle (a2,b1) & (a3,b2), which are
+  anti-correlated, Bob flips his bit
+
+A block of pairs is an array of two-qubit states (n, 2, 2) and the joint
+outcome amplitudes of all pairs are two stacked matrix products with the
+measurement basis of each side. States & basis stay in the x-z plane, so all
+amplitudes are real. Only the counts per (setting A, setting B, outcome A,
+outcome B) are carried between blocks, which is all the S-value and QBER need.
+
+Eve intercepts Bob's half, measures it in the standard or hadamard basis and
+re-sends the eigenstate she found, as in the prepare & measure protocols.
+"""
+
+ALICE_ANGLES = np.array([0.0, np.pi / 4, np.pi / 2])
+BOB_ANGLES = np.array([np.pi / 4, np.pi / 2, 3 * np.pi / 4])
+
+#settings (Alice, Bob) of the CHSH terms & their signs
+CHSH_TERMS = (((0, 0), 1), ((0, 2), -1), ((2, 0), 1), ((2, 2), 1))
+
+#settings (Alice, Bob) measured along the same angle
+KEY_SETTINGS = ((1, 0), (2, 1))
+
+SINGLET = np.array([[0.0, 1.0], [-1.0, 0.0]]) / np.sqrt(2)
+
+#Eve's measurement basis, indexed by [basis][component][outcome]: 0 -> standard, 1 -> hadamard
+EVE_BASIS = np.array([np.eye(2), np.array([[1.0, 1.0], [1.0, -1.0]]) / np.sqrt(2)])
+
+#measurement basis along the angles, indexed by [n][component][outcome]
+def AngleBasis(angles):
+	c = np.cos(angles / 2)
+	s = np.sin(angles / 2)
+	return np.stack([np.stack([c, -s], axis=-1), np.stack([s, c], axis=-1)], axis=-2)
+
+#sampling one outcome per row out of the rows of probabilities
+def Sample(probabilities, rng):
+	cdf = np.cumsum(probabilities, axis=1)
+	u = rng.random(len(cdf))[:, None] * cdf[:, -1:]
+	return np.minimum(np.count_nonzero(cdf <= u, axis=1), probabilities.shape[1] - 1)
+
+#Eve measures Bob's half of every pair & re-sends the eigenstate, the pairs become product states
+def Intercept(pairs, eveBasis, rng):
+	basis = EVE_BASIS[eveBasis]
+	#Alice's (unnormalised) state for each of Eve's outcomes
+	alice = np.matmul(pairs, basis).transpose(0, 2, 1)
+	outcomes = Sample(np.sum(alice ** 2, axis=2), rng)
+	rows = np.arange(len(pairs))
+	alice = alice[rows, outcomes]
+	alice /= np.linalg.norm(alice, axis=1, keepdims=True)
+	return alice[:, :, None] * basis[rows, :, outcomes][:, None, :]
+
+#one block of E91: pairs -> intercept -> measure, returns the settings & outcomes of both sides
+def E91Block(no_of_pairs, eveExist, rng):
+	pairs = np.broadcast_to(SINGLET, (no_of_pairs, 2, 2))
+
+	if eveExist:
+		eveBasis = rng.integers(0, 2, no_of_pairs)
+		pairs = Intercept(pairs, eveBasis, rng)
+
+	aliceSettings = rng.integers(0, 3, no_of_pairs)
+	bobSettings = rng.integers(0, 3, no_of_pairs)
+	aliceBasis = AngleBasis(ALICE_ANGLES[aliceSettings])
+	bobBasis = AngleBasis(BOB_ANGLES[bobSettings])
+
+	#amplitudes <i|<j| pair> of the 4 joint outcomes, outcome index = 2 i + j
+	amplitudes = np.matmul(np.matmul(aliceBasis.transpose(0, 2, 1), pairs), bobBasis)
+	outcomes = Sample(amplitudes.reshape(no_of_pairs, 4) ** 2, rng)
+	return aliceSettings, bobSettings, outcomes >> 1, outcomes & 1
+
+#This class is used for the result of E91: correlation counts, CHSH S-value & QBER
+#class start "E91Result"
+class E91Result():
+
+	#initialization
+	def __init__(self):
+		self.counts = np.zeros((3, 3, 2, 2), dtype=np.int64)
+
+	#adding the counts of one block
+	def Add(self,aliceSettings,bobSettings,aliceOutcomes,bobOutcomes):
+		index = ((aliceSettings * 3 + bobSettings) * 2 + aliceOutcomes) * 2 + bobOutcomes
+		self.counts += np.bincount(index, minlength=36).reshape(3, 3, 2, 2)
+
+	#merging the result of another worker
+	def Merge(self,other):
+		self.counts += other.counts
+
+	def NoOfPairs(self):
+		return int(self.counts.sum())
+
+	#correlation E(a,b) of the settings & its standard error
+	def Correlation(self,a,b):
+		n = self.counts[a, b]
+		total = n.sum()
+		if not total:
+			return None, None
+		e = (n[0, 0] + n[1, 1] - n[0, 1] - n[1, 0]) / total
+		return e, np.sqrt(max(1 - e ** 2, 0) / total)
+
+	#CHSH S-value & its standard error
+	def S(self):
+		s = 0.0
+		variance = 0.0
+		for (a, b), sign in CHSH_TERMS:
+			e, error = self.Correlation(a, b)
+			if e is None:
+				return None, None
+			s += sign * e
+			variance += error ** 2
+		return s, np.sqrt(variance)
+
+	def SiftedBits(self):
+		return int(sum(self.counts[a, b].sum() for a, b in KEY_SETTINGS))
+
+	#QBER in %, the key pairs are anti-correlated so equal outcomes are errors
+	def QBER(self):
+		sifted = self.SiftedBits()
+		if not sifted:
+			return None
+		errors = sum(self.counts[a, b, 0, 0] + self.counts[a, b, 1, 1] for a, b in KEY_SETTINGS)
+		return np.round((errors / sifted),5)*100
+#class end "E91Result"
+
+#executing E91 for no_of_pairs in blocks of block_size, keySink(aliceKey, bobKey) receives the sifted key of each block
+def StreamE91(no_of_pairs, block_size, eveExist, rng, keySink=None):
+	assert block_size > 0, "Block size must be positive!"
+	result = E91Result()
+	remaining = no_of_pairs
+
+	while remaining > 0:
+		n = min(block_size, remaining)
+		aliceSettings, bobSettings, aliceOutcomes, bobOutcomes = E91Block(n, eveExist, rng)
+		result.Add(aliceSettings, bobSettings, aliceOutcomes, bobOutcomes)
+		if keySink is not None:
+			sifted = ((aliceSettings == 1) & (bobSettings == 0)) | ((aliceSettings == 2) & (bobSettings == 1))
+			keySink(aliceOutcomes[sifted].astype(np.uint8), (1 - bobOutcomes[sifted]).astype(np.uint8))
+		remaining -= n
+
+	return result
+
+if __name__ == "__main__":
+	rng = np.random.default_rng()
+	for eveExist in (False, True):
+		result = StreamE91(10**7, 1 << 18, eveExist, rng)
+		s, error = result.S()
+		print("Eve exist:", eveExist, " Pairs:", result.NoOfPairs(), " S =", np.round(s, 4), "±", np.round(error, 4), " QBER =", result.QBER(), "%")
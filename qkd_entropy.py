@@ -0,0 +1,229 @@
+#!/usr/bin/python
+
+"""
+
+@title		: Pluggable bulk entropy sources of packed random bits for the basis & bits of Alice, Eve & Bob
+
+"""
+
+import numpy as np
+import time
+import os
+
+"""
+An entropy source produces random bytes in bulk with the Fill method of its
+backend and everything else is cut out of them:
+
+Bits(n)                     : n random bits, 1 bit of entropy each
+integers(low, high, size)   : uniform integers, log2(high - low) bits each
+                              rounded up, out of range values are rejected
+random(size)                : uniform floats in [0, 1), 53 bits each
+
+integers & random take the arguments of a numpy Generator, so a source can be
+passed as the entropy of the batch engine: the basis & bits of the users are
+drawn from it, the measurement outcomes from the generator of the simulation.
+
+Backends (a backend overrides Fill, the default is the entropy pool of the OS):
+GeneratorSource   : PCG64 or Philox bit generator of numpy, raw 64-bit words
+UrandomSource     : the entropy pool of the OS (os.urandom)
+QrngFileSource    : a recorded dump of a hardware QRNG, memory-mapped & read once
+
+Every source counts the bytes it produced & the time spent end to end in Bytes,
+Bits, integers & random (unpacking & rejection included), Throughput() is in
+bits per second. State() holds these counters along with the position of the
+backend, so a resumed run reports the throughput of the whole run.
+"""
+
+#This class is used for the common methods of the entropy sources: bits, integers, floats & throughput
+#class start "EntropySource"
+class EntropySource():
+
+	#initialization
+	def __init__(self,name):
+		self.name = name
+		self.noOfBytes = 0
+		self.elapsed = 0.0
+
+	#no_of_bytes random bytes (uint8 array) of the backend, os.urandom unless a backend overrides it
+	def Fill(self,no_of_bytes):
+		return np.frombuffer(os.urandom(no_of_bytes), dtype=np.uint8)
+
+	def __Bytes(self,no_of_bytes):
+		self.noOfBytes += no_of_bytes
+		return self.Fill(no_of_bytes)
+
+	def __Bits(self,no_of_bits):
+		return np.unpackbits(self.__Bytes((no_of_bits + 7) // 8), count=no_of_bits)
+
+	#no_of_bytes random bytes
+	def Bytes(self,no_of_bytes):
+		start = time.perf_counter()
+		data = self.__Bytes(no_of_bytes)
+		self.elapsed += time.perf_counter() - start
+		return data
+
+	#no_of_bits random bits i.e. 0 & 1
+	def Bits(self,no_of_bits):
+		start = time.perf_counter()
+		bits = self.__Bits(no_of_bits)
+		self.elapsed += time.perf_counter() - start
+		return bits
+
+	#uniform integers in [low, high) as numpy's Generator.integers
+	def integers(self,low,high=None,size=None,dtype=np.int64):
+		start = time.perf_counter()
+		if high is None:
+			low, high = 0, low
+		n = 1 if size is None else int(np.prod(size))
+		m = int(high) - int(low)
+		assert m > 0, "high must be larger than low!"
+		values = self.__Uniform(n, m)
+		values = dtype(values[0] + low) if size is None else (values + low).astype(dtype).reshape(size)
+		self.elapsed += time.perf_counter() - start
+		return values
+
+	#n integers in [0, m): values of the no. of bits of m - 1, the ones beyond m rejected
+	def __Uniform(self,n,m):
+		width = (m - 1).bit_length()
+		if width == 0:
+			return np.zeros(n, dtype=np.uint64)
+
+		accepted = list()
+		remaining = n
+		while remaining > 0:
+			#drawing the expected no. of values & some more, so one pass is usually enough
+			count = remaining if m == 1 << width else int(remaining * (1 << width) / m * 1.05) + 64
+			if width <= 8:
+				bits = self.__Bits(count * width).reshape(count, width)
+				values = (bits << np.arange(width - 1, -1, -1, dtype=np.uint8)).sum(axis=1, dtype=np.uint64)
+			else:
+				words = self.__Bytes(count * 8).view(np.uint64)
+				values = words >> np.uint64(64 - width)
+			values = values[values < m][:remaining]
+			accepted.append(values)
+			remaining -= len(values)
+
+		return accepted[0] if len(accepted) == 1 else np.concatenate(accepted)
+
+	#uniform floats in [0, 1) as numpy's Generator.random
+	def random(self,size=None):
+		start = time.perf_counter()
+		n = 1 if size is None else int(np.prod(size))
+		words = self.__Bytes(n * 8).view(np.uint64)
+		values = (words >> np.uint64(11)) * (1.0 / 9007199254740992.0)
+		values = float(values[0]) if size is None else values.reshape(size)
+		self.elapsed += time.perf_counter() - start
+		return values
+
+	#bits of entropy delivered per second, timed end to end of Bytes, Bits, integers & random
+	def Throughput(self):
+		if not self.elapsed:
+			return None
+		return self.noOfBytes * 8 / self.elapsed
+
+	#state to resume the source from: the counters, a backend adds its position
+	def State(self):
+		return {"noOfBytes": self.noOfBytes, "elapsed": self.elapsed}
+
+	def SetState(self,state):
+		self.noOfBytes = state["noOfBytes"]
+		self.elapsed = state["elapsed"]
+#class end "EntropySource"
+
+#This class is used for the PCG64 & Philox entropy source
+#class start "GeneratorSource"
+class GeneratorSource(EntropySource):
+
+	#initialization, bitGenerator is 'pcg64' or 'philox'
+	def __init__(self,bitGenerator='pcg64',seed=None):
+		EntropySource.__init__(self, bitGenerator)
+		if bitGenerator == 'pcg64':
+			self.bitGenerator = np.random.PCG64(seed)
+		elif bitGenerator == 'philox':
+			self.bitGenerator = np.random.Philox(seed)
+		else:
+			raise Exception("Unknown bit generator " + str(bitGenerator))
+
+	#raw 64-bit words of the bit generator, the bytes beyond no_of_bytes are dropped
+	def Fill(self,no_of_bytes):
+		words = self.bitGenerator.random_raw((no_of_bytes + 7) // 8)
+		return words.view(np.uint8)[:no_of_bytes]
+
+	def State(self):
+		state = EntropySource.State(self)
+		state["bitGenerator"] = self.bitGenerator.state
+		return state
+
+	def SetState(self,state):
+		EntropySource.SetState(self, state)
+		self.bitGenerator.state = state["bitGenerator"]
+#class end "GeneratorSource"
+
+#This class is used for the os.urandom entropy source, the default Fill of EntropySource
+#class start "UrandomSource"
+class UrandomSource(EntropySource):
+
+	#initialization
+	def __init__(self):
+		EntropySource.__init__(self, 'urandom')
+#class end "UrandomSource"
+
+#This class is used for the entropy source of a recorded QRNG dump, every byte is used once
+#class start "QrngFileSource"
+class QrngFileSource(EntropySource):
+
+	#initialization, offset is the first byte to use
+	def __init__(self,fileName,offset=0):
+		EntropySource.__init__(self, fileName)
+		self.dump = np.memmap(fileName, dtype=np.uint8, mode='r')
+		self.position = offset
+
+	#the next no_of_bytes of the dump, a view of the memory map
+	def Fill(self,no_of_bytes):
+		if self.position + no_of_bytes > len(self.dump):
+			raise Exception("QRNG dump " + self.name + " is exhausted after " + str(self.position) + " bytes!")
+		data = self.dump[self.position:self.position + no_of_bytes]
+		self.position += no_of_bytes
+		return data
+
+	#bits left in the dump
+	def Remaining(self):
+		return (len(self.dump) - self.position) * 8
+
+	def State(self):
+		state = EntropySource.State(self)
+		state["position"] = self.position
+		return state
+
+	def SetState(self,state):
+		EntropySource.SetState(self, state)
+		self.position = state["position"]
+#class end "QrngFileSource"
+
+#opening the entropy source of a name: 'pcg64', 'philox', 'urandom' or the file name of a QRNG dump
+def OpenEntropySource(name, seed=None):
+	if name in ('pcg64', 'philox'):
+		return GeneratorSource(name, seed)
+	if name == 'urandom':
+		return UrandomSource()
+	return QrngFileSource(name)
+
+#throughput of the backends, with the bit by bit loop of the scripts for comparison
+def Benchmark(no_of_bits, block_size):
+	import tempfile
+
+	start = time.perf_counter()
+	for i in range(min(no_of_bits, 10**6)):
+		np.random.randint(0,2)
+	print("np.random loop:", "%.3e" % (min(no_of_bits, 10**6) / (time.perf_counter() - start)), "bit(s)/s")
+
+	with tempfile.NamedTemporaryFile() as dump:
+		dump.write(os.urandom(no_of_bits // 8))
+		dump.flush()
+		for label, source in (('pcg64', GeneratorSource('pcg64')), ('philox', GeneratorSource('philox')), ('urandom', UrandomSource()), ('qrng dump', QrngFileSource(dump.name))):
+			for i in range(0, no_of_bits, block_size):
+				source.Bits(min(block_size, no_of_bits - i))
+			print((label + ":").ljust(16), "%.3e" % source.Throughput(), "bit(s)/s")
+
+if __name__ == "__main__":
+	Benchmark(10**9, 1 << 24)
@@ -0,0 +1,129 @@
+#!/usr/bin/python
+
+"""
+
+@title		: JIT-compiled prepare/measure/sift kernel of the batch engine (optional Numba)
+
+"""
+
+import numpy as np
+
+try:
+	import numba
+except ImportError:
+	numba = None
+
+"""
+The kernel runs one block of a 2-basis protocol in a single compiled loop:
+per qubit it draws Alice's basis & bit, Eve's basis and Bob's basis, samples
+every measurement outcome exactly from the probability |<m|psi>|^2 of the
+prepared state, and sifts in place. No intermediate array is allocated.
+
+Randomness is counter based (splitmix64 of seed + qubit counter), so a block
+is fully determined by the seed drawn from the caller's generator and the
+loop needs no shared random state. The basis & bits may instead be drawn
+beforehand (from an entropy source), then only the measurements are sampled
+in the kernel.
+
+When Numba is not installed HAVE_NUMBA is False and the batch engine keeps
+its pure NumPy path.
+"""
+
+HAVE_NUMBA = numba is not None
+
+#sifting rules
+SIFT_BASIS = 0		#BB84: keep the qubits measured in Alice's basis, keys are the bits
+SIFT_INDEX = 1		#KMB09: keep the mismatched indeces, Bob's key is his basis (standard -> 1, hadamard -> 0)
+SIFT_CONCLUSIVE = 2	#B92: keep Bob's conclusive results (outcome 1), Bob's key is his basis (standard -> 1, hadamard -> 0)
+
+if HAVE_NUMBA:
+
+	GAMMA = np.uint64(0x9E3779B97F4A7C15)
+	MIX1 = np.uint64(0xBF58476D1CE4E5B9)
+	MIX2 = np.uint64(0x94D049BB133111EB)
+	UNIT = 1.0 / 9007199254740992.0
+
+	#splitmix64 of the counter x
+	@numba.njit(inline='always')
+	def _Mix(x):
+		x = x + GAMMA
+		x = (x ^ (x >> np.uint64(30))) * MIX1
+		x = (x ^ (x >> np.uint64(27))) * MIX2
+		return x ^ (x >> np.uint64(31))
+
+	#outcome of a measurement with probability p of outcome 0 for the uniform word u, exact for any p
+	@numba.njit(inline='always')
+	def _Measure(p, u):
+		return np.uint64((u >> np.uint64(11)) * UNIT >= p)
+
+	#one qubit: measurements & sifting of the choices with the uniform words u1, u2, returns Bob's key bit & whether it is kept
+	@numba.njit(inline='always')
+	def _Qubit(probability, resendProbability, sift, eveExist, aliceBasis, aliceBit, eveBasis, bobBasis, u1, u2):
+		one = np.uint64(1)
+		if eveExist:
+			eveBit = _Measure(probability[eveBasis, aliceBasis, aliceBit], u1)
+			bobBit = _Measure(resendProbability[bobBasis, eveBasis, eveBit], u2)
+		else:
+			bobBit = _Measure(probability[bobBasis, aliceBasis, aliceBit], u2)
+
+		if sift == SIFT_BASIS:
+			return bobBit, aliceBasis == bobBasis
+		elif sift == SIFT_INDEX:
+			return one - bobBasis, aliceBit != bobBit
+		return one - bobBasis, bobBit == one
+
+	#the loop is branch free on the random choices, sifting always writes and only advances on a kept qubit
+	@numba.njit(cache=True, nogil=True)
+	def _Block(probability, resendProbability, sift, no_of_qubits, eveExist, seed, aliceKey, bobKey):
+		seed = np.uint64(seed)
+		one = np.uint64(1)
+		two = np.uint64(2)
+		length = 0
+
+		for i in range(no_of_qubits):
+			counter = seed + np.uint64(3 * i)
+			choices = _Mix(counter)
+			aliceBasis = choices & one
+			aliceBit = (choices >> one) & one
+			bobBasis = (choices >> two) & one
+			eveBasis = (choices >> np.uint64(3)) & one
+
+			bobKeyBit, keep = _Qubit(probability, resendProbability, sift, eveExist, aliceBasis, aliceBit, eveBasis, bobBasis, _Mix(counter + one), _Mix(counter + two))
+			aliceKey[length] = aliceBit
+			bobKey[length] = bobKeyBit
+			length += keep
+
+		return length
+
+	#the same loop with the basis & bits drawn beforehand (e.g. from an entropy source), only the measurements are counter based
+	@numba.njit(cache=True, nogil=True)
+	def _DrawnBlock(probability, resendProbability, sift, eveExist, seed, aliceBasis, aliceBits, eveBasis, bobBasis, aliceKey, bobKey):
+		seed = np.uint64(seed)
+		one = np.uint64(1)
+		length = 0
+
+		for i in range(len(aliceBits)):
+			counter = seed + np.uint64(2 * i)
+			aliceBit = np.uint64(aliceBits[i])
+			bobKeyBit, keep = _Qubit(probability, resendProbability, sift, eveExist, np.uint64(aliceBasis[i]), aliceBit, np.uint64(eveBasis[i]), np.uint64(bobBasis[i]), _Mix(counter), _Mix(counter + one))
+			aliceKey[length] = aliceBit
+			bobKey[length] = bobKeyBit
+			length += keep
+
+		return length
+
+#one block of a 2-basis protocol with the compiled kernel, returns the sifted keys of Alice & Bob
+#probability is the table of Alice's states, resendProbability the table of the states re-sent by Eve
+#choices (aliceBasis, aliceBits, eveBasis, bobBasis) are the basis & bits drawn beforehand, None to draw them in the kernel
+def JitBlock(probability, resendProbability, sift, no_of_qubits, eveExist, rng, choices=None):
+	assert HAVE_NUMBA, "Numba is not installed!"
+	aliceKey = np.empty(no_of_qubits, dtype=np.uint8)
+	bobKey = np.empty(no_of_qubits, dtype=np.uint8)
+	seed = rng.integers(0, 2**63)
+	if choices is None:
+		length = _Block(probability, resendProbability, sift, no_of_qubits, bool(eveExist), seed, aliceKey, bobKey)
+	else:
+		aliceBasis, aliceBits, eveBasis, bobBasis = choices
+		assert len(aliceBits) == no_of_qubits, "Choices must be drawn for every qubit!"
+		length = _DrawnBlock(probability, resendProbability, sift, bool(eveExist), seed, aliceBasis, aliceBits, eveBasis, bobBasis, aliceKey, bobKey)
+	return aliceKey[:length], bobKey[:length]
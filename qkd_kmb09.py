@@ -0,0 +1,191 @@
+#!/usr/bin/python
+
+"""
+
+@title		: High-dimensional KMB09 on the batch engine, N mutually unbiased bases in d dimensions
+
+"""
+
+import numpy as np
+import itertools
+
+"""
+KMB09 in d dimensions with N mutually unbiased bases:
+
+Basis 0 is the standard basis |n>, basis k >= 1 is a chirped Fourier basis
+	|f(k,j)> = 1/sqrt(d) sum_n w^(j n) c(k,n) |n>,   w = exp(2 pi i / d)
+with the chirp c(k,n) = exp(i pi (k-1) n^2 (d+1) / d). Standard & Fourier
+basis are unbiased for any d, N up to d+1 is available for prime d.
+
+For a prime power d = p^m (m > 1, e.g. d = 4, 8, 9, 16) the d+1 basis are
+the Wootters-Fields basis of the Galois field GF(p^m): n and j are vectors of
+m digits over GF(p), the Fourier transform is the one of (Z_p)^m and the
+chirp of basis k is the quadratic form tr(a y^2) of the field element a = k-1
+	c(k,n) = exp(2 pi i n.M_a.n / p)            p odd
+	c(k,n) = i^(n.M_a.n mod 4)                   p = 2
+with M_a[i][j] = tr(a x^i x^j), x a root of an irreducible polynomial of
+degree m. M_a - M_b = M_(a-b) is non-singular for a != b, which makes the
+basis mutually unbiased. For any other d only standard & Fourier basis are
+guaranteed, the chirped basis beyond them are checked & refused when biased.
+
+States are prepared & measured for a whole block with one FFT per block:
+preparing |f(k,j)> is an inverse DFT of the index j times the chirp and the
+amplitudes in basis k are the DFT of the state times the conjugate chirp
+(an m-dimensional FFT of size p per axis for a prime power). Outcomes are
+sampled exactly from |amplitude|^2.
+
+Protocol, all announcements are integer arrays:
+- Alice sends index i in basis a, Bob measures in basis b & gets index j
+- Alice announces i and a pair of basis {a, a'} (a' random) after the measurement
+- Bob keeps the symbol when j != i & b is in the pair: then b != a, so Alice's
+  basis is the other one of the pair
+- the key bit is 1 when Alice's basis is the larger of the pair
+For N = 2 the pair is always {0, 1} and this is the original KMB09 with the
+basis as key bit.
+"""
+
+#d as p^m with p its smallest prime factor, m is 0 when d is not a prime power
+def PrimePower(d):
+	p = next(q for q in range(2, d + 1) if d % q == 0)
+	m = 0
+	while d % p == 0:
+		d //= p
+		m += 1
+	return p, (m if d == 1 else 0)
+
+#remainder of the polynomial a by the monic polynomial b over GF(p), coefficients lowest degree first
+def PolynomialRemainder(a, b, p):
+	a = list(a)
+	while len(a) >= len(b):
+		c = a[-1]
+		for i in range(len(b)):
+			a[len(a) - len(b) + i] = (a[len(a) - len(b) + i] - c * b[i]) % p
+		a.pop()
+	return a
+
+#monic irreducible polynomial of degree m over GF(p), found by trial division
+def IrreduciblePolynomial(p, m):
+	for coefficients in itertools.product(range(p), repeat=m):
+		f = list(coefficients) + [1]
+		if f[0] and not any(not any(PolynomialRemainder(f, list(g) + [1], p)) for degree in range(1, m // 2 + 1) for g in itertools.product(range(p), repeat=degree)):
+			return f
+	raise Exception("No irreducible polynomial of degree " + str(m) + " over GF(" + str(p) + ")")
+
+#traces tr(x^n), n < count, of a root x of the monic irreducible f over GF(p): its power sums by Newton's identities
+def PowerTraces(f, p, count):
+	m = len(f) - 1
+	s = [m % p]
+	for k in range(1, count):
+		total = sum(f[m - i] * s[k - i] for i in range(1, min(k - 1, m) + 1))
+		if k <= m:
+			total += k * f[m - k]
+		s.append(-total % p)
+	return s
+
+#m digits over GF(p) of the indeces 0..p^m-1, the axes of the index reshaped to (p,)*m
+def Digits(p, m):
+	return (np.arange(p ** m)[:, None] // p ** np.arange(m - 1, -1, -1)) % p
+
+#chirps c(k,n) of the Wootters-Fields basis k = 1..noOfBases-1 of GF(p^m)
+def GaloisChirps(p, m, noOfBases):
+	traces = PowerTraces(IrreduciblePolynomial(p, m), p, 3 * m - 2)
+	digits = Digits(p, m)
+	ij = np.add.outer(np.arange(m), np.arange(m))
+	chirps = np.ones((noOfBases, p ** m), dtype=complex)
+	for k in range(1, noOfBases):
+		a = digits[k - 1][::-1]
+		M = sum(a[l] * np.take(traces, ij + l) for l in range(m)) % p
+		Q = np.einsum('xi,ij,xj->x', digits, M, digits)
+		chirps[k] = 1j ** (Q % 4) if p == 2 else np.exp(2j * np.pi * (Q % p) / p)
+	return chirps
+
+#This class is used for the d-dimensional KMB09 engine: basis, prepare, measure & sift of a block of symbols
+#class start "Kmb09Engine"
+class Kmb09Engine():
+
+	#initialization
+	def __init__(self,dimension=2,noOfBases=2):
+		assert dimension >= 2, "Dimension must be at least 2!"
+		assert noOfBases >= 2, "At least 2 basis are needed!"
+		if noOfBases > dimension + 1:
+			raise ValueError("No more than d + 1 mutually unbiased basis exist in d = " + str(dimension))
+		self.dimension = dimension
+		self.noOfBases = noOfBases
+
+		p, m = PrimePower(dimension)
+		if m > 1:
+			#the transforms run on the m axes of size p of (Z_p)^m
+			self.shape = (p,) * m
+			self.chirp = GaloisChirps(p, m, noOfBases)
+		else:
+			self.shape = (dimension,)
+			n = np.arange(dimension)
+			k = np.arange(noOfBases)[:, None] - 1
+			self.chirp = np.exp(1j * np.pi * k * n ** 2 * (dimension + 1) / dimension)
+		self.__CheckUnbiased()
+
+	#full basis matrices, column j of basis k is |f(k,j)>
+	def Basis(self):
+		d = self.dimension
+		fourier = np.fft.ifftn(np.eye(d).reshape((d,) + self.shape), axes=self.__Axes()).reshape(d, d).T * np.sqrt(d)
+		bases = self.chirp[:, :, None] * fourier[None, :, :]
+		bases[0] = np.eye(d)
+		return bases
+
+	#axes of the transforms of a block of states reshaped to (symbols,) + shape
+	def __Axes(self):
+		return tuple(range(1, len(self.shape) + 1))
+
+	#every pair of basis must satisfy |<f(k,i)|f(l,j)>|^2 = 1/d
+	def __CheckUnbiased(self):
+		bases = self.Basis()
+		for k in range(self.noOfBases):
+			for l in range(k + 1, self.noOfBases):
+				overlap = np.abs(bases[k].conj().T @ bases[l]) ** 2
+				if not np.allclose(overlap, 1.0 / self.dimension):
+					raise ValueError(str(self.noOfBases) + " chirped Fourier basis are not mutually unbiased in d = " + str(self.dimension))
+
+	#preparing the states of index listOfIndeces in basis listOfBasis, one row per symbol
+	def Prepare(self,listOfBasis,listOfIndeces):
+		d = self.dimension
+		states = np.zeros((len(listOfIndeces), d), dtype=complex)
+		states[np.arange(len(listOfIndeces)), listOfIndeces] = 1.0
+		fourier = listOfBasis > 0
+		states[fourier] = np.fft.ifftn(states[fourier].reshape((-1,) + self.shape), axes=self.__Axes()).reshape(-1, d) * np.sqrt(d) * self.chirp[listOfBasis[fourier]]
+		return states
+
+	#measuring the states in listOfBasis, returns the indeces of the outcomes (the states are overwritten)
+	def Measure(self,states,listOfBasis,rng):
+		d = self.dimension
+		amplitudes = states
+		fourier = listOfBasis > 0
+		amplitudes[fourier] = np.fft.fftn((states[fourier] * self.chirp[listOfBasis[fourier]].conj()).reshape((-1,) + self.shape), axes=self.__Axes()).reshape(-1, d) / np.sqrt(d)
+		cdf = np.cumsum(np.abs(amplitudes) ** 2, axis=1)
+		u = rng.random(len(states))[:, None] * cdf[:, -1:]
+		return np.minimum(np.count_nonzero(cdf <= u, axis=1), d - 1)
+
+	#one block of KMB09: prepare -> intercept -> measure -> sift, returns the sifted keys of Alice & Bob
+	#the choices of the users are drawn from entropy when given, the measurement outcomes from rng
+	def Block(self,no_of_symbols,eveExist,rng,entropy=None):
+		N = self.noOfBases
+		source = rng if entropy is None else entropy
+		aliceBasis = source.integers(0, N, no_of_symbols)
+		aliceIndeces = source.integers(0, self.dimension, no_of_symbols)
+		states = self.Prepare(aliceBasis, aliceIndeces)
+
+		if eveExist:
+			eveBasis = source.integers(0, N, no_of_symbols)
+			eveIndeces = self.Measure(states, eveBasis, rng)
+			states = self.Prepare(eveBasis, eveIndeces)
+
+		bobBasis = source.integers(0, N, no_of_symbols)
+		bobIndeces = self.Measure(states, bobBasis, rng)
+
+		#announced pair of basis {aliceBasis, partnerBasis}
+		partnerBasis = (aliceBasis + source.integers(1, N, no_of_symbols)) % N
+		sifted = (aliceIndeces != bobIndeces) & ((bobBasis == aliceBasis) | (bobBasis == partnerBasis))
+		aliceKey = (aliceBasis > partnerBasis)[sifted]
+		#Bob's basis is excluded, so Alice's is the larger of the pair when Bob's is the smaller
+		bobKey = (bobBasis == np.minimum(aliceBasis, partnerBasis))[sifted]
+		return aliceKey.astype(np.uint8), bobKey.astype(np.uint8)
+#class end "Kmb09Engine"
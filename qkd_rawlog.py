@@ -0,0 +1,210 @@
+#!/usr/bin/python
+
+"""
+
+@title		: Memory-mapped raw log of the bases, bits & results of every cycle for post-hoc analysis
+
+"""
+
+import numpy as np
+import json
+import os
+
+"""
+A raw log is a directory:
+
+rawlog.json   : names & widths (bits per event) of the streams
+<name>.bits   : the values of the stream packed MSB first, appended cycle by cycle
+index.bin     : one record per cycle: cycle, no. of events, offset of the cycle
+                (bytes per bit of width) & mask of the streams recorded
+
+Every cycle is padded to a multiple of 8 events, so it starts at offset x width
+bytes of every stream and a cycle (or a range of cycles) is a plain slice of
+the memory-mapped file, read without a copy.
+A cycle may be appended in several blocks (Append between BeginCycle and
+EndCycle), the events short of a group of 8 are carried to the next block.
+Streams not recorded in a cycle (e.g. Eve's without Eve) are written as zeros
+and left out of the mask. Cycles are read by their position in the index, the
+cycle ids are only recorded (a log appended by two runs holds both).
+"""
+
+INDEX = np.dtype([('cycle', '<u8'), ('events', '<u8'), ('offset', '<u8'), ('streams', '<u8')])
+
+#packing values of width bits into bytes, MSB first
+def PackValues(values, width):
+	values = np.asarray(values, dtype=np.uint8)
+	if width == 1:
+		return np.packbits(values)
+	bits = (values[:, None] >> np.arange(width - 1, -1, -1, dtype=np.uint8)) & 1
+	return np.packbits(bits.ravel())
+
+#unpacking count values of width bits
+def UnpackValues(packed, count, width):
+	bits = np.unpackbits(packed, count=count * width)
+	if width == 1:
+		return bits
+	return (bits.reshape(count, width) << np.arange(width - 1, -1, -1, dtype=np.uint8)).sum(axis=1, dtype=np.uint8)
+
+#This class is used for the raw log methods: appending the streams of a cycle & reading cycle ranges zero-copy
+#class start "RawLog"
+class RawLog():
+
+	#initialization, streams = {name: width} for a new log, None to open an existing one
+	def __init__(self,directory,streams=None):
+		self.directory = directory
+		header = os.path.join(directory, "rawlog.json")
+
+		if os.path.exists(header):
+			with open(header) as headerFile:
+				self.streams = json.load(headerFile)
+			if streams is not None and streams != self.streams:
+				raise Exception("Raw log " + directory + " has the streams " + str(self.streams))
+		else:
+			assert streams, "Streams are needed to create a raw log!"
+			os.makedirs(directory, exist_ok=True)
+			self.streams = dict(streams)
+			with open(header, 'w') as headerFile:
+				json.dump(self.streams, headerFile)
+
+		self.__names = list(self.streams)
+		self.__files = None
+		self.__maps = dict()
+		self.__indexMap = None
+		self.__cycle = None
+
+	def __Path(self,name):
+		return os.path.join(self.directory, name + ".bits")
+
+	#opening the files for appending
+	def __Open(self):
+		if self.__files is None:
+			self.__files = dict((name, open(self.__Path(name), 'ab')) for name in self.__names)
+			self.__index = open(os.path.join(self.directory, "index.bin"), 'ab')
+
+	#starting a cycle
+	def BeginCycle(self,cycle):
+		assert self.__cycle is None, "Cycle " + str(self.__cycle) + " is not ended!"
+		self.__Open()
+		offsets = set(self.__files[name].tell() // self.streams[name] for name in self.__names)
+		assert len(offsets) == 1, "Streams of the raw log are out of step!"
+		self.__cycle = cycle
+		self.__offset = offsets.pop()
+		self.__events = 0
+		self.__mask = 0
+		self.__carry = dict((name, np.zeros(0, dtype=np.uint8)) for name in self.__names)
+
+	#appending a block of events of the cycle, streams are name = values
+	def Append(self,**streams):
+		assert self.__cycle is not None, "No cycle begun!"
+		count = len(next(iter(streams.values())))
+		for i, name in enumerate(self.__names):
+			if name in streams:
+				assert len(streams[name]) == count, "Streams must be the same length!"
+				values = np.asarray(streams[name], dtype=np.uint8)
+				self.__mask |= 1 << i
+			else:
+				values = np.zeros(count, dtype=np.uint8)
+			self.__Write(name, np.concatenate((self.__carry[name], values)), False)
+		self.__events += count
+
+	#writing the values in groups of 8, the rest is carried (or padded with zeros at the end of the cycle)
+	def __Write(self,name,values,final):
+		width = self.streams[name]
+		if final and len(values) % 8:
+			values = np.concatenate((values, np.zeros(8 - len(values) % 8, dtype=np.uint8)))
+		whole = len(values) - len(values) % 8
+		if whole:
+			self.__files[name].write(PackValues(values[:whole], width).tobytes())
+		self.__carry[name] = values[whole:]
+
+	#ending the cycle: padding to 8 events & writing its index record
+	def EndCycle(self):
+		for name in self.__names:
+			self.__Write(name, self.__carry[name], True)
+			self.__files[name].flush()
+		record = np.array([(self.__cycle, self.__events, self.__offset, self.__mask)], dtype=INDEX)
+		self.__index.write(record.tobytes())
+		self.__index.flush()
+		self.__cycle = None
+
+	#all the events of a cycle in one call
+	def Record(self,cycle,**streams):
+		self.BeginCycle(cycle)
+		self.Append(**streams)
+		self.EndCycle()
+
+	def Close(self):
+		if self.__files is not None:
+			for f in self.__files.values():
+				f.close()
+			self.__index.close()
+			self.__files = None
+		self.__maps = dict()
+		self.__indexMap = None
+
+	#sizes (bytes) of the index & stream files, to truncate the log back to them later
+	def Sizes(self):
+		assert self.__cycle is None, "Cycle " + str(self.__cycle) + " is not ended!"
+		names = ["index.bin"] + [name + ".bits" for name in self.__names]
+		paths = [os.path.join(self.directory, name) for name in names]
+		return dict((name, os.path.getsize(path) if os.path.exists(path) else 0) for name, path in zip(names, paths))
+
+	#truncating the index & stream files to the sizes of Sizes(), e.g. to the last checkpoint of a resumed run
+	def Truncate(self,sizes):
+		self.Close()
+		for name, size in sizes.items():
+			path = os.path.join(self.directory, name)
+			if os.path.exists(path):
+				os.truncate(path, size)
+
+	#index of the cycles, memory-mapped, re-mapped when the file has grown
+	def Index(self):
+		path = os.path.join(self.directory, "index.bin")
+		size = os.path.getsize(path) if os.path.exists(path) else 0
+		if self.__indexMap is None or self.__indexMap.nbytes != size:
+			self.__indexMap = np.memmap(path, dtype=INDEX, mode='r') if size else np.zeros(0, dtype=INDEX)
+		return self.__indexMap
+
+	#memory map of a stream, re-mapped when the file has grown
+	def __Map(self,name):
+		size = os.path.getsize(self.__Path(name))
+		if name not in self.__maps or len(self.__maps[name]) != size:
+			self.__maps[name] = np.memmap(self.__Path(name), dtype=np.uint8, mode='r') if size else np.zeros(0, dtype=np.uint8)
+		return self.__maps[name]
+
+	#bytes of a stream for the cycles first..last (index positions), a zero-copy view, every cycle padded to 8 events
+	def Packed(self,name,first,last=None):
+		index = self.Index()
+		last = first if last is None else last
+		width = self.streams[name]
+		start = int(index['offset'][first]) * width
+		stop = (int(index['offset'][last]) + (int(index['events'][last]) + 7) // 8) * width
+		return self.__Map(name)[start:stop]
+
+	#values of a stream for the events start..stop of the cycle at index position i
+	def Values(self,name,i,start=0,stop=None):
+		return self.__Values(self.Index()[i], name, start, stop)
+
+	#values of a stream for the events start..stop of the cycle of the index record entry
+	def __Values(self,entry,name,start,stop):
+		events = int(entry['events'])
+		stop = events if stop is None else min(stop, events)
+		width = self.streams[name]
+		assert start % 8 == 0, "Reads must start on a multiple of 8 events!"
+		offset = (int(entry['offset']) + start // 8) * width
+		packed = self.__Map(name)[offset:offset + ((stop - start) * width + 7) // 8]
+		return UnpackValues(packed, stop - start, width)
+
+	#the streams recorded in the cycle at index position i, block_size events at a time
+	def Blocks(self,i,block_size):
+		assert block_size > 0 and block_size % 8 == 0, "Block size must be a positive multiple of 8!"
+		#the index record is read once for all the blocks
+		entry = self.Index()[i]
+		names = [name for name in self.__names if int(entry['streams']) >> self.__names.index(name) & 1]
+		for start in range(0, int(entry['events']), block_size):
+			yield dict((name, self.__Values(entry, name, start, start + block_size)) for name in names)
+
+	#stream recorded in the cycle at index position i
+	def Recorded(self,name,i):
+		return bool(int(self.Index()['streams'][i]) >> self.__names.index(name) & 1)
+#class end "RawLog"
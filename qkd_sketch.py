@@ -0,0 +1,194 @@
+#!/usr/bin/python
+
+"""
+
+@title		: Mergeable streaming sketches of the QBER distribution (histogram & KLL quantiles)
+
+"""
+
+import numpy as np
+import random
+
+"""
+Each cycle adds one QBER, the sketches keep a bounded summary instead of the
+list of QBERs:
+
+Histogram   : fixed bins over [0, 100] %, exact counts & smallest value per bin
+KLLSketch   : KLL quantile sketch, O(k log n) items, rank error ~ 1.7/k
+QBERSketch  : both of the above plus count, sum, min & max, the tail
+              percentiles (beyond the rank error of the KLL sketch) are
+              read from the histogram
+
+All of them are picklable and Merge() the sketch of another worker process,
+so a run split over processes reports the same percentiles & distribution.
+The coin flips of the KLL compactions come from a generator of a fixed seed
+by default, so the same QBERs give the same sketch; its state is pickled
+along with the sketch and a resumed run flips the same coins.
+"""
+
+#This class is used for the fixed-bin histogram of the QBER
+#class start "Histogram"
+class Histogram():
+
+	#initialization
+	def __init__(self,noOfBins=1000,low=0.0,high=100.0):
+		self.low = low
+		self.high = high
+		self.counts = np.zeros(noOfBins, dtype=np.int64)
+		self.lowest = np.full(noOfBins, np.inf)
+
+	def Edges(self):
+		return np.linspace(self.low, self.high, len(self.counts) + 1)
+
+	def Add(self,value):
+		i = int((value - self.low) / (self.high - self.low) * len(self.counts))
+		i = min(max(i, 0), len(self.counts) - 1)
+		self.counts[i] += 1
+		self.lowest[i] = min(self.lowest[i], value)
+
+	#smallest value of the bin holding percentile p, exact in rank & within one bin width in value
+	#a value some cycle produced, exact for the discrete QBERs that are alone in their bin
+	def Percentile(self,p):
+		total = self.counts.sum()
+		if not total:
+			return None
+		i = np.searchsorted(np.cumsum(self.counts), p / 100.0 * total, side='left')
+		return float(self.lowest[min(i, len(self.counts) - 1)])
+
+	def Merge(self,other):
+		assert len(self.counts) == len(other.counts) and self.low == other.low and self.high == other.high, "Histograms must have the same bins!"
+		self.counts += other.counts
+		self.lowest = np.minimum(self.lowest, other.lowest)
+#class end "Histogram"
+
+#This class is used for the KLL quantile sketch of the QBER
+#class start "KLLSketch"
+class KLLSketch():
+
+	#initialization, k controls the accuracy, seed the coin flips of the compactions
+	def __init__(self,k=200,seed=0):
+		self.k = k
+		self.count = 0
+		self.compactors = [list()]
+		self.__random = random.Random(seed)
+
+	#capacity of the compactor at level h, geometric in the distance from the top level
+	def __Capacity(self,h):
+		depth = len(self.compactors) - h - 1
+		return max(int(np.ceil(self.k * (2.0 / 3.0) ** depth)), 2)
+
+	def __Size(self):
+		return sum(len(c) for c in self.compactors)
+
+	def __MaxSize(self):
+		return sum(self.__Capacity(h) for h in range(len(self.compactors)))
+
+	#compacting the lowest full level: every other sorted item moves one level up with double weight
+	def __Compress(self):
+		for h in range(len(self.compactors)):
+			if len(self.compactors[h]) >= self.__Capacity(h):
+				if h + 1 == len(self.compactors):
+					self.compactors.append(list())
+				items = sorted(self.compactors[h])
+				#an odd item out stays at this level
+				keep = items[len(items) - len(items) % 2:]
+				offset = self.__random.randint(0, 1)
+				self.compactors[h + 1].extend(items[offset:len(items) - len(keep):2])
+				self.compactors[h] = keep
+				return
+
+	def Add(self,value):
+		self.compactors[0].append(value)
+		self.count += 1
+		if self.__Size() >= self.__MaxSize():
+			self.__Compress()
+
+	def Merge(self,other):
+		while len(self.compactors) < len(other.compactors):
+			self.compactors.append(list())
+		for h in range(len(other.compactors)):
+			self.compactors[h].extend(other.compactors[h])
+		self.count += other.count
+		while self.__Size() >= self.__MaxSize():
+			self.__Compress()
+
+	#value at quantile q in [0, 1]
+	def Quantile(self,q):
+		if not self.count:
+			return None
+		items = list()
+		weights = list()
+		for h in range(len(self.compactors)):
+			items.extend(self.compactors[h])
+			weights.extend([2 ** h] * len(self.compactors[h]))
+		order = np.argsort(items, kind='stable')
+		ranks = np.cumsum(np.asarray(weights)[order])
+		i = np.searchsorted(ranks, q * ranks[-1], side='left')
+		return np.asarray(items)[order][min(i, len(items) - 1)]
+#class end "KLLSketch"
+
+#This class is used for the streaming summary of the QBERs of a run
+#class start "QBERSketch"
+class QBERSketch():
+
+	#initialization
+	def __init__(self,noOfBins=1000,k=200,seed=0):
+		self.histogram = Histogram(noOfBins)
+		self.quantiles = KLLSketch(k, seed)
+		self.count = 0
+		self.total = 0.0
+		self.minimum = None
+		self.maximum = None
+
+	#adding the QBER (%) of one cycle
+	def Add(self,qber):
+		self.histogram.Add(qber)
+		self.quantiles.Add(qber)
+		self.count += 1
+		self.total += qber
+		self.minimum = qber if self.minimum is None else min(self.minimum, qber)
+		self.maximum = qber if self.maximum is None else max(self.maximum, qber)
+
+	#merging the sketch of another worker
+	def Merge(self,other):
+		self.histogram.Merge(other.histogram)
+		self.quantiles.Merge(other.quantiles)
+		self.count += other.count
+		self.total += other.total
+		for value in (other.minimum, other.maximum):
+			if value is not None:
+				self.minimum = value if self.minimum is None else min(self.minimum, value)
+				self.maximum = value if self.maximum is None else max(self.maximum, value)
+
+	def Mean(self):
+		return self.total / self.count if self.count else None
+
+	#QBER (%) at percentile p in [0, 100], the extremes are exact, None for an empty sketch
+	#the tails come from the histogram (exact rank), the body from the KLL sketch (finer values)
+	def Percentile(self,p):
+		if not self.count:
+			return None
+		if p <= 0:
+			return self.minimum
+		if p >= 100:
+			return self.maximum
+		if p <= 100.0 * 2.0 / self.quantiles.k or p >= 100.0 * (1 - 2.0 / self.quantiles.k):
+			return min(max(self.histogram.Percentile(p), self.minimum), self.maximum)
+		return self.quantiles.Quantile(p / 100.0)
+
+	#plotting the QBER distribution with its tail percentiles
+	def Plot(self,title="QBER Distribution",percentiles=(50, 99, 99.9)):
+		import matplotlib.pyplot as plt
+
+		plt.figure()
+		edges = self.histogram.Edges()
+		plt.bar(edges[:-1], self.histogram.counts, width=np.diff(edges), align='edge', color=(0,0,1), label='Cycle(s)')
+		#an empty sketch has no percentiles to mark
+		for p in percentiles if self.count else ():
+			plt.axvline(self.Percentile(p), linestyle='--', color='r')
+			plt.text(self.Percentile(p), plt.ylim()[1] * 0.95, " p" + str(p), color='r')
+		plt.xlabel("QBER (%)")
+		plt.ylabel("CYCLE(S)")
+		plt.title(title)
+		plt.grid(axis='y', linestyle='-')
+#class end "QBERSketch"
@@ -0,0 +1,254 @@
+#!/usr/bin/python
+
+"""
+
+@title		: Binary per-cycle trace of the QKD simulations with lazy symbol & qubit tables
+
+"""
+
+import numpy as np
+import struct
+import io
+import os
+
+"""
+A trace file is a header followed by one record per cycle.
+
+File header   : magic "QKDT", version (uint8), protocol name length (uint8), protocol name
+Cycle record  : cycle (uint64), no. of qubits (uint64), eve exist (uint8), no. of streams (uint8)
+                then per stream: name length (uint8), name, bits packed 8 per byte
+
+Every stream is one bit per qubit (basis or bit), so a cycle of n qubits costs
+ceil(n/8) bytes per stream. Symbols, indeces & qubit states are never stored,
+they are derived from the bits when a cycle is rendered.
+"""
+
+MAGIC = b"QKDT"
+VERSION = 1
+
+RECORD = struct.Struct("<QQBB")
+
+#symbols of the basis: 0 -> standard, 1 -> hadamard
+BASIS_SYMBOLS = np.array(["+", "X"])
+
+#symbols of the bits, indexed by [basis][bit]
+BIT_SYMBOLS = np.array([["|", "━"], ["╱", "╲"]])
+
+#prepared qubit states as printed by Qubit.Show(), indexed by [basis][bit]
+QUBIT_STATES = {
+	"bb84"	: np.array([["|0>", "|1>"], ["0.71|0> + 0.71|1>", "0.71|0> + 0.71|1>"]]),
+	"kmb09"	: np.array([["|0>", "|0>"], ["0.71|0> + 0.71|1>", "0.71|0> + 0.71|1>"]]),
+}
+
+#static method for converting bits and basis into classical symbols
+def ConvertToSymbols(listOfBits, listOfBasis, isBasis):
+	if isBasis:
+		return BASIS_SYMBOLS[listOfBits].tolist()
+	return BIT_SYMBOLS[listOfBasis, listOfBits].tolist()
+
+#This class is used for the trace methods: recording cycles into a compact binary file & rendering them on demand
+#class start "Trace"
+class Trace():
+
+	#initialization, fileName = None keeps the current cycle only in memory
+	def __init__(self,fileName,protocol):
+		assert protocol in QUBIT_STATES, "Unknown protocol: " + str(protocol)
+		self.protocol = protocol
+		self.fileName = fileName
+		self.__offsets = dict()
+
+		if fileName is None:
+			self.__file = io.BytesIO()
+			self.__WriteHeader()
+		elif os.path.exists(fileName) and os.path.getsize(fileName):
+			self.__file = open(fileName, 'r+b')
+			self.__ReadHeader()
+			self.__Scan()
+		else:
+			self.__file = open(fileName, 'w+b')
+			self.__WriteHeader()
+
+	def __WriteHeader(self):
+		name = self.protocol.encode()
+		self.__file.write(MAGIC + struct.pack("<BB", VERSION, len(name)) + name)
+
+	def __ReadHeader(self):
+		self.__file.seek(0)
+		magic = self.__file.read(4)
+		version, length = struct.unpack("<BB", self.__file.read(2))
+		protocol = self.__file.read(length).decode()
+		if magic != MAGIC or version != VERSION:
+			raise Exception("Not a QKD trace file: " + self.fileName)
+		if protocol != self.protocol:
+			raise Exception("Trace file " + self.fileName + " belongs to " + protocol)
+
+	#index the records of an existing file, so that appending & rendering continue from it
+	#a record torn by a crash (short header or streams) is cut off at its start
+	def __Scan(self):
+		end = self.__file.seek(0, io.SEEK_END)
+		offset = self.__file.seek(6 + len(self.protocol))
+		while offset < end:
+			record = self.__file.read(RECORD.size)
+			if len(record) < RECORD.size:
+				break
+			cycle, noOfQubits, eveExist, noOfStreams = RECORD.unpack(record)
+			stop = offset + RECORD.size
+			for s in range(noOfStreams):
+				length = self.__file.read(1)
+				if not length:
+					stop = end + 1
+					break
+				stop += 1 + length[0] + (noOfQubits + 7) // 8
+				self.__file.seek(stop)
+			if stop > end:
+				break
+			self.__offsets[cycle] = offset
+			offset = stop
+		if offset < end:
+			self.__file.truncate(offset)
+
+	#recording one cycle, streams are name = list of bits
+	def Record(self,cycle,eveExist,**streams):
+		noOfQubits = len(next(iter(streams.values())))
+		if self.fileName is None:
+			#in memory the cycle replaces the previous one, so memory does not grow over the run
+			self.__file.truncate(6 + len(self.protocol))
+			self.__offsets = dict()
+		self.__file.seek(0, io.SEEK_END)
+		self.__offsets[cycle] = self.__file.tell()
+		self.__file.write(RECORD.pack(cycle, noOfQubits, bool(eveExist), len(streams)))
+		for name, bits in streams.items():
+			assert len(bits) == noOfQubits, "Streams must be the same length!"
+			name = name.encode()
+			self.__file.write(bytes([len(name)]) + name)
+			self.__file.write(np.packbits(np.asarray(bits, dtype=np.uint8)).tobytes())
+
+	#size (bytes) of the trace, to truncate it back to later
+	def Size(self):
+		self.__file.flush()
+		return self.__file.seek(0, io.SEEK_END)
+
+	#truncating the trace to a size of Size(), e.g. to the last checkpoint of a resumed run
+	def Truncate(self,size):
+		self.__file.flush()
+		self.__file.truncate(size)
+		self.__offsets = dict()
+		self.__Scan()
+
+	#cycles available in the trace
+	def Cycles(self):
+		return sorted(self.__offsets)
+
+	#reading one cycle back as bit arrays
+	def Read(self,cycle):
+		self.__file.flush()
+		self.__file.seek(self.__offsets[cycle])
+		cycle, noOfQubits, eveExist, noOfStreams = RECORD.unpack(self.__file.read(RECORD.size))
+		streams = dict()
+		for s in range(noOfStreams):
+			length = self.__file.read(1)[0]
+			name = self.__file.read(length).decode()
+			packed = np.frombuffer(self.__file.read((noOfQubits + 7) // 8), dtype=np.uint8)
+			streams[name] = np.unpackbits(packed, count=noOfQubits)
+		return bool(eveExist), streams
+
+	def Close(self):
+		if self.fileName is not None:
+			self.__file.close()
+
+	#bit representation of the streams s of a cycle, as returned by Read
+	def RenderBits(self,eveExist,s):
+		lines = ["--------BIT REPRESENTATION--------"]
+		lines.append("Alice Basis        : " + str(s["aliceBasis"].tolist()))
+		lines.append("Qubits |ei>        : " + str(s["aliceBits"].tolist()))
+		if eveExist:
+			lines.append("Eve Basis |gk>     : " + str(s["eveBasis"].tolist()))
+			lines.append("Qubits |<gk|ei>|^2 : " + str(s["eveBits"].tolist()))
+			lines.append("Bob Basis |ej>     : " + str(s["bobBasis"].tolist()))
+			lines.append("Qubits |<ej|gk>|^2 : " + str(s["bobBits"].tolist()))
+		else:
+			lines.append("Bob Basis |ej>     : " + str(s["bobBasis"].tolist()))
+			lines.append("Qubits |<ej|ei>|^2 : " + str(s["bobBits"].tolist()))
+		lines.append(" ")
+		if self.protocol == "kmb09":
+			aliceIndeces, bobIndeces, mismatch, selected = self.__Kmb09Sifting(s)
+			lines.append("Alice Indeces      : " + str(aliceIndeces))
+			lines.append("Bob Indeces        : " + str(bobIndeces))
+			lines.append(" ")
+			lines.append("Mismatch Index     : " + str(mismatch))
+			lines.append(" ")
+			lines.append("Selected Bits      : " + str(selected))
+		else:
+			lines.append("Correct Basis      : " + str((s["aliceBasis"] == s["bobBasis"]).astype(int).tolist()))
+		return "\n".join(lines)
+
+	#symbol representation of the streams s of a cycle
+	def RenderSymbols(self,eveExist,s):
+		lines = ["--------SYMBOL REPRESENTATION--------"]
+		lines.append("Alice Basis        : " + str(ConvertToSymbols(s["aliceBasis"], s["aliceBasis"], True)))
+		lines.append("Qubits |ei>        : " + str(ConvertToSymbols(s["aliceBits"], s["aliceBasis"], False)))
+		if eveExist:
+			lines.append("Eve Basis |gk>     : " + str(ConvertToSymbols(s["eveBasis"], s["eveBasis"], True)))
+			lines.append("Qubits |<gk|ei>|^2 : " + str(ConvertToSymbols(s["eveBits"], s["eveBasis"], False)))
+			lines.append("Bob Basis |ej>     : " + str(ConvertToSymbols(s["bobBasis"], s["bobBasis"], True)))
+			lines.append("Qubits |<ej|gk>|^2 : " + str(ConvertToSymbols(s["bobBits"], s["bobBasis"], False)))
+		else:
+			lines.append("Bob Basis |ej>     : " + str(ConvertToSymbols(s["bobBasis"], s["bobBasis"], True)))
+			lines.append("Qubits |<ej|ei>|^2 : " + str(ConvertToSymbols(s["bobBits"], s["bobBasis"], False)))
+		lines.append(" ")
+		if self.protocol == "kmb09":
+			lines.append("Mismatch Index     : " + str(self.__Kmb09Sifting(s)[2]))
+		else:
+			lines.append("Correct Basis      : " + str([str(x) for x in (s["aliceBasis"] == s["bobBasis"]).astype(int).tolist()]))
+		return "\n".join(lines)
+
+	#qubit representation of the streams s of a cycle, the states as prepared by Alice (and re-sent by Eve)
+	def RenderQubits(self,eveExist,s):
+		states = QUBIT_STATES[self.protocol]
+		lines = ["-------QUBIT REPRESENTATION-------"]
+		var = "Alice Qubits |ei>      : "
+		for state in states[s["aliceBasis"], s["aliceBits"]]:
+			var += state.ljust(17)[:17] + "   "
+		lines.append(var)
+		if eveExist:
+			var = "Bob Qubits |<ej|ei>|^2 : "
+			for state in states[s["eveBasis"], s["eveBits"]]:
+				var += state.ljust(17)[:17] + "   "
+			lines.append(var)
+		return "\n".join(lines)
+
+	#full human-readable report of a cycle, as printed with LOG on, the cycle is read & decoded once
+	def Render(self,cycle):
+		eveExist, s = self.Read(cycle)
+		noOfQubits = str(len(s["aliceBits"]))
+		lines = [" ", " ", self.RenderBits(eveExist, s), " ", " ", self.RenderSymbols(eveExist, s), " ", " ", self.RenderQubits(eveExist, s), " ", " "]
+		lines.append("Alice generates " + noOfQubits + " random Basis")
+		lines.append("Alice sends to Bob " + noOfQubits + " encoded Qubits")
+		if eveExist:
+			lines.append("Eve generates " + noOfQubits + " random Basis")
+			lines.append("Eve intercepts and decode Alice's " + noOfQubits + " encoded Qubits")
+			lines.append("Eve sends to Bob as Alice's " + noOfQubits + " encoded Qubits")
+		lines.append("Bob generates " + noOfQubits + " random Basis")
+		lines.append("Bob receives and decode Alice's " + noOfQubits + " encoded Qubits")
+		lines += [" ", " "]
+		return "\n".join(lines)
+
+	#indeces, mismatch & selected bits of KMB09 derived from the recorded bits
+	def __Kmb09Sifting(self,s):
+		aliceIndeces = [str(x) for x in (s["aliceBits"] + 1).tolist()]
+		bobIndeces = [str(x) for x in (s["bobBits"] + 1).tolist()]
+		mismatch = list()
+		selected = list()
+		for i in range(len(aliceIndeces)):
+			if aliceIndeces[i] != bobIndeces[i]:
+				mismatch.append("1")
+				#Bob's bit which reveals Alice's basis: 1 after index '1', 0 after index '2'
+				if s["bobBits"][i] == (aliceIndeces[i] == '1'):
+					selected.append('0' if s["bobBasis"][i] else '1')
+				else:
+					selected.append('x')
+			else:
+				mismatch.append("0")
+				selected.append('x')
+		return aliceIndeces, bobIndeces, mismatch, selected
+#class end "Trace"